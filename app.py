@@ -1,264 +1,154 @@
 import streamlit as st
-import folium
-from streamlit_folium import st_folium
-import numpy as np
+import streamlit.components.v1 as components
+import os
+import subprocess
 import time
-from datetime import datetime
-import random
-import json
-import threading
-from streamlit_autorefresh import st_autorefresh
+from concurrent.futures import ThreadPoolExecutor
 
-st.set_page_config(page_title="GPS RTS Sim - Live", layout="wide")
+from yuddhasphere.commands import DEMOLISH_REFUND, JET_COST
+from yuddhasphere.engine import (
+    COSTS, DEFAULT_ORIGIN, STRUCTURE_HEALTH, TICK_INTERVAL, WAVE_INTERVAL, defense_count, income_rate, site_error,
+    threat_count,
+)
+from yuddhasphere.evaluate import candidate_sites, run_cli
+from yuddhasphere.eventlog import format_event
+from yuddhasphere.mapview import (
+    COMPACT_RENDER_CACHE_SIZE, MAP_ATTRIBUTION, MAP_TILES, RENDER_CACHE_SIZE, MapDiffer, MapView, RenderCache,
+    map_features,
+)
+from yuddhasphere.profiling import Profiler, export_trace, session_footprint
+from yuddhasphere.server import MatchHost
+from yuddhasphere.units import STRUCTURE_UNITS
 
-# Auto-refresh component
-st_autorefresh(interval=2000, key="maprefresh")  # Refresh every 2 seconds
+st.set_page_config(page_title="GPS RTS Sim - Live", layout="wide")
 
 # ────────────────────────────────────────────────
-# Improved Constants and Config
+# UI Config
 # ────────────────────────────────────────────────
-MAX_BUILD_RADIUS_KM = 50
-COSTS = {
-    "Missile Silo": 400, 
-    "SAM Site": 600, 
-    "Airfield": 800,
-    "Radar Station": 300,
-    "Resource Depot": 500
-}
-STRUCTURE_HEALTH = {
-    "Missile Silo": 150,
-    "SAM Site": 100,
-    "Airfield": 200,
-    "Radar Station": 75,
-    "Resource Depot": 120
-}
-TICK_INTERVAL = 1.0  # Update more frequently
-BASE_INCOME = 25
-RESOURCE_MULTIPLIER = 1.0
+METRICS_REFRESH = 1.0  # Seconds between reruns of each live fragment
+MAP_REFRESH = 2.0
+LOG_REFRESH = 2.0
+STATUS_REFRESH = 1.0
+DEBUG_REFRESH = 1.0
+LAB_REFRESH = 1.0  # Seconds between checks on a running Layout Lab job
+LAB_JOBS = 2  # Layout Lab runs at once across all sessions; each already uses every core
+# Autosaves go here, one file per game; resume with ?game=<seed>. Empty turns autosave off.
+SAVE_DIR = os.environ.get("YUDDHASPHERE_SAVE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "saves"))
+# Run each match in its own server process ("0": simulation threads in this process)
+MATCH_PROCESSES = os.environ.get("YUDDHASPHERE_MATCH_PROCESSES", "1") != "0"
+# "1": map tiles from static/tiles (seed with `python -m yuddhasphere tiles seed`) instead of the tile CDN
+LOCAL_TILES = os.environ.get("YUDDHASPHERE_LOCAL_TILES", "0") == "1"
+# "1": smaller per-session map caches (hashed map mirror, 256-entry render cache)
+COMPACT_SESSIONS = os.environ.get("YUDDHASPHERE_COMPACT_SESSIONS", "0") == "1"
+# Per-session memory cap in MB; a session over it drops to compact caches. 0: no cap.
+SESSION_MEMORY_MB = float(os.environ.get("YUDDHASPHERE_SESSION_MEMORY_MB", "0"))
+MEMORY_CHECK_INTERVAL = 30.0  # Seconds between a capped session's footprint checks
+
+_live_map_component = components.declare_component(
+    "live_map", path=os.path.join(os.path.dirname(os.path.abspath(__file__)), "components", "live_map")
+)
+
+
+@st.cache_resource
+def match_host():
+    """One host per server process, shared by every session"""
+    return MatchHost(SAVE_DIR, processes=MATCH_PROCESSES)
+
+
+@st.cache_resource
+def lab_pool():
+    """Threads that wait on Layout Lab subprocesses, so a long evaluation does not hold up the session"""
+    return ThreadPoolExecutor(max_workers=LAB_JOBS, thread_name_prefix="layout-lab")
+
+
+def map_tiles():
+    """Tile URL template for the map: the local tile cache when LOCAL_TILES is set, else the CDN"""
+    if not LOCAL_TILES:
+        return MAP_TILES
+    # Streamlit's static route, relative to the component's page (<base>/component/<name>/index.html)
+    return "../../app/static/tiles/{z}/{x}/{y}.png"
+
+
+def ensure_simulation():
+    """Return the session's handle on its match (?game=<seed>), joining or restarting it as needed.
+
+    Fragments call this on every run too: they rerun on their own, so a match
+    that idled out while the page sat in a background tab is resumed from there.
+    """
+    sim = st.session_state.get('sim')
+    if sim is None or not sim.is_alive():
+        if sim is not None:
+            sim.close()
+        game = st.query_params.get("game", "")
+        sim = match_host().join(int(game) if game.isdigit() else None)
+        st.session_state.sim = sim
+    if st.query_params.get("game") != str(sim.seed):
+        st.query_params["game"] = str(sim.seed)
+    return sim
+
+
+def session_bytes():
+    """{session state key: bytes} for this session, leaving out the match itself in thread mode"""
+    shared = [] if MATCH_PROCESSES else [st.session_state.sim]
+    return session_footprint(st.session_state.to_dict(), shared)
+
+
+def enforce_memory_cap():
+    """Every MEMORY_CHECK_INTERVAL, drop to compact map caches if the session is over SESSION_MEMORY_MB"""
+    now = time.monotonic()
+    if now - st.session_state.memory_checked < MEMORY_CHECK_INTERVAL:
+        return
+    st.session_state.memory_checked = now
+    used = sum(session_bytes().values())
+    prof.count("session KB", used // 1024)
+    if used > SESSION_MEMORY_MB * 2 ** 20:
+        st.session_state.render_cache.clear()
+        st.session_state.render_cache.max_entries = COMPACT_RENDER_CACHE_SIZE
+        st.session_state.map_differ.make_compact()
 
 # ────────────────────────────────────────────────
 # Initialize Session State
 # ────────────────────────────────────────────────
 if 'initialized' not in st.session_state:
     defaults = {
-        'player_lat': 19.0760,
-        'player_lon': 72.8777,
-        'structures': [],
-        'jets': [],
-        'incoming_missiles': [],
-        'enemy_aircraft': [],
-        'resources': 2000,
-        'last_tick': time.time(),
-        'log': [],
         'build_mode': None,
         'build_preview': None,
         'selected_structure': None,
-        'score': 0,
-        'wave': 1,
-        'resource_nodes': [],
-        'last_wave_spawn': time.time(),
-        'enemy_missiles_intercepted': 0,
-        'structures_destroyed': 0,
-        'game_speed': 1.0,
-        'paused': False,
-        'last_update': time.time(),
-        'game_time': 0,
-        'map_center': [19.0760, 72.8777],
+        'map_center': list(DEFAULT_ORIGIN),
         'map_zoom': 10,
+        'map_differ': MapDiffer(compact=COMPACT_SESSIONS),
+        'map_view': MapView(),
+        'render_cache': RenderCache(COMPACT_RENDER_CACHE_SIZE if COMPACT_SESSIONS else RENDER_CACHE_SIZE),
+        'memory_checked': 0.0,
+        'last_click_id': 0,
+        'profiling': False,
+        'profiling_sent': None,  # (id of the sim, value) last passed to the match's profiler
+        'lab_result': None,
+        'lab_job': None,  # {'future', 'label', 'type'} of the Layout Lab run in progress
+        'lab_error': None,
+        'render_profiler': Profiler("render"),
         'initialized': True,
     }
-    
+
     for key, value in defaults.items():
         st.session_state[key] = value
-    
-    # Generate initial resource nodes
-    st.session_state.resource_nodes = []
-    for i in range(5):
-        angle = random.uniform(0, 2 * np.pi)
-        distance = random.uniform(10, 40)
-        lat = st.session_state.player_lat + (distance / 111) * np.cos(angle)
-        lon = st.session_state.player_lon + (distance / (111 * np.cos(np.radians(st.session_state.player_lat)))) * np.sin(angle)
-        st.session_state.resource_nodes.append({
-            'lat': lat,
-            'lon': lon,
-            'resources': random.randint(200, 500),
-            'id': i
-        })
-
-def add_log(msg, type="info"):
-    colors = {
-        "info": "📘",
-        "warning": "⚠️",
-        "danger": "🚨",
-        "success": "✅",
-        "resource": "💰"
-    }
-    icon = colors.get(type, "📝")
-    ts = datetime.now().strftime("%H:%M:%S")
-    st.session_state.log.append(f"{icon} [{ts}] {msg}")
-    if len(st.session_state.log) > 50:
-        st.session_state.log.pop(0)
 
-# ────────────────────────────────────────────────
-# Helper Functions
-# ────────────────────────────────────────────────
-def haversine(lat1, lon1, lat2, lon2):
-    """Calculate distance between two points in km"""
-    R = 6371.0
-    dlat = np.radians(lat2 - lat1)
-    dlon = np.radians(lon2 - lon1)
-    a = np.sin(dlat/2)**2 + np.cos(np.radians(lat1)) * np.cos(np.radians(lat2)) * np.sin(dlon/2)**2
-    c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
-    return R * c
+sim = ensure_simulation()
+snap = sim.read()
+prof = st.session_state.render_profiler
+prof.enabled = st.session_state.profiling
+# The match's profiler is shared by everyone watching it (in thread mode, the very same object),
+# so only pass this session's toggle on when it changes - not on every rerun
+if st.session_state.profiling_sent != (id(sim), st.session_state.profiling):
+    sim.profiler.enabled = st.session_state.profiling
+    st.session_state.profiling_sent = (id(sim), st.session_state.profiling)
 
-# ────────────────────────────────────────────────
-# Game Simulation Thread (Runs in Background)
-# ────────────────────────────────────────────────
-def game_tick():
-    """Perform one game tick - updates positions, combat, etc."""
-    if st.session_state.paused:
-        return
-    
-    now = time.time()
-    time_delta = min(now - st.session_state.last_update, 0.1) * st.session_state.game_speed
-    st.session_state.last_update = now
-    st.session_state.game_time += time_delta
-    
-    # Generate income
-    income_multiplier = 1.0
-    income_multiplier += len([s for s in st.session_state.structures if s['type'] == "Resource Depot"]) * 0.25
-    st.session_state.resources += BASE_INCOME * income_multiplier * time_delta / 3.0
-    
-    # Spawn enemy waves
-    if now - st.session_state.last_wave_spawn > 30:  # Every 30 seconds
-        st.session_state.wave += 1
-        st.session_state.last_wave_spawn = now
-        
-        # Spawn enemy missiles
-        for _ in range(min(st.session_state.wave, 5)):
-            offset = random.uniform(-1.5, 1.5)
-            target_offset = random.uniform(-0.3, 0.3)
-            st.session_state.incoming_missiles.append({
-                'start_lat': st.session_state.player_lat + offset * 3,
-                'start_lon': st.session_state.player_lon + offset * 3,
-                'target_lat': st.session_state.player_lat + target_offset,
-                'target_lon': st.session_state.player_lon + target_offset,
-                'launched_at': now,
-                'progress': 0.0,
-                'speed': 0.05 + (st.session_state.wave * 0.005),
-                'damage': 20 + (st.session_state.wave * 5),
-                'id': len(st.session_state.incoming_missiles)
-            })
-        
-        # Spawn enemy bombers at higher waves
-        if st.session_state.wave >= 3:
-            for _ in range(min(st.session_state.wave - 2, 3)):
-                st.session_state.enemy_aircraft.append({
-                    'lat': st.session_state.player_lat + random.uniform(-2, 2),
-                    'lon': st.session_state.player_lon + random.uniform(-2, 2),
-                    'target_type': random.choice(['Missile Silo', 'Airfield', 'Resource Depot']),
-                    'health': 100,
-                    'id': len(st.session_state.enemy_aircraft) + 1,
-                    'speed_lat': random.uniform(-0.01, 0.01),
-                    'speed_lon': random.uniform(-0.01, 0.01)
-                })
-        
-        add_log(f"Wave {st.session_state.wave} incoming!", "danger")
-    
-    # Update missiles
-    missiles_to_remove = []
-    for inc in st.session_state.incoming_missiles[:]:
-        inc['progress'] += inc['speed'] * time_delta
-        
-        # Check for SAM interception
-        intercepted = False
-        for s in st.session_state.structures:
-            if s['type'] == "SAM Site":
-                # Calculate current missile position
-                cur_lat = inc['start_lat'] + inc['progress'] * (inc['target_lat'] - inc['start_lat'])
-                cur_lon = inc['start_lon'] + inc['progress'] * (inc['target_lon'] - inc['start_lon'])
-                dist = haversine(s['lat'], s['lon'], cur_lat, cur_lon)
-                if dist < 20:  # 20km interception range
-                    intercept_chance = 0.6 * time_delta
-                    if random.random() < intercept_chance:
-                        intercepted = True
-                        missiles_to_remove.append(inc)
-                        s['intercepts'] = s.get('intercepts', 0) + 1
-                        st.session_state.enemy_missiles_intercepted += 1
-                        st.session_state.score += 25
-                        add_log(f"SAM Site intercepted enemy missile!", "success")
-                        break
-        
-        # Check for impact
-        if inc['progress'] >= 1.0 and inc not in missiles_to_remove:
-            missiles_to_remove.append(inc)
-            add_log("💥 Enemy missile impact!", "danger")
-            
-            # Damage nearby structures
-            for s in st.session_state.structures:
-                dist = haversine(s['lat'], s['lon'], inc['target_lat'], inc['target_lon'])
-                if dist < 8:  # 8km blast radius
-                    damage = int(inc['damage'] * (1 - dist/8))
-                    s['health'] = max(0, s['health'] - damage)
-                    if s['health'] == 0:
-                        st.session_state.structures_destroyed += 1
-                        add_log(f"{s['type']} #{s['id']} destroyed!", "danger")
-                        if st.session_state.selected_structure and s['id'] == st.session_state.selected_structure['id']:
-                            st.session_state.selected_structure = None
-    
-    # Remove hit/missed missiles
-    for inc in missiles_to_remove:
-        if inc in st.session_state.incoming_missiles:
-            st.session_state.incoming_missiles.remove(inc)
-    
-    # Update enemy aircraft movement
-    for enemy in st.session_state.enemy_aircraft[:]:
-        # Find target
-        target_structures = [s for s in st.session_state.structures if s['type'] == enemy['target_type']]
-        if target_structures:
-            target = min(target_structures, 
-                        key=lambda s: haversine(enemy['lat'], enemy['lon'], s['lat'], s['lon']))
-            
-            # Move toward target
-            lat_diff = target['lat'] - enemy['lat']
-            lon_diff = target['lon'] - enemy['lon']
-            distance = max(0.001, haversine(enemy['lat'], enemy['lon'], target['lat'], target['lon']))
-            
-            enemy['lat'] += (lat_diff / distance) * 0.02 * time_delta
-            enemy['lon'] += (lon_diff / distance) * 0.02 * time_delta
-            
-            # Attack if close enough
-            if distance < 0.5:
-                target['health'] = max(0, target['health'] - 30 * time_delta)
-                if random.random() < 0.1:
-                    add_log(f"Enemy bomber attacking {target['type']} #{target['id']}!", "warning")
-                if target['health'] == 0:
-                    st.session_state.structures_destroyed += 1
-    
-    # Update jets movement
-    for jet in st.session_state.jets[:]:
-        if jet['status'] == 'patrolling':
-            # Move in a patrol pattern
-            jet['lat'] += random.uniform(-0.01, 0.01) * time_delta
-            jet['lon'] += random.uniform(-0.01, 0.01) * time_delta
-            jet['fuel'] -= 0.5 * time_delta
-            
-            # Auto-engage enemies in range
-            for enemy in st.session_state.enemy_aircraft[:]:
-                if haversine(jet['lat'], jet['lon'], enemy['lat'], enemy['lon']) < 5:
-                    if jet['missiles_left'] > 0 and random.random() < 0.3 * time_delta:
-                        jet['missiles_left'] -= 1
-                        st.session_state.enemy_aircraft.remove(enemy)
-                        st.session_state.score += 100
-                        add_log(f"Jet #{jet['id']} shot down enemy bomber!", "success")
-                        break
-            
-            if jet['fuel'] <= 0:
-                st.session_state.jets.remove(jet)
-                add_log(f"Jet #{jet['id']} ran out of fuel", "warning")
-    
-    # Remove destroyed structures
-    st.session_state.structures = [s for s in st.session_state.structures if s['health'] > 0]
+# Drop the selection once the structure is gone
+selected = None
+if st.session_state.selected_structure is not None:
+    selected = snap.structures.row(st.session_state.selected_structure)
+    if selected is None:
+        st.session_state.selected_structure = None
 
 # ────────────────────────────────────────────────
 # Sidebar - Enhanced
@@ -269,182 +159,195 @@ st.sidebar.title("🚀 GPS RTS - Live Command")
 st.sidebar.markdown("### 🎮 Game Controls")
 col1, col2 = st.sidebar.columns(2)
 with col1:
-    if st.button("⏸️ Pause" if not st.session_state.paused else "▶️ Resume"):
-        st.session_state.paused = not st.session_state.paused
+    if st.button("⏸️ Pause" if not snap.paused else "▶️ Resume"):
+        sim.control(paused=not snap.paused)
         st.rerun()
 with col2:
-    if st.button("🔄 Reset"):
+    if st.button("🔄 Reset", help="Leave this match and start a new one"):
+        sim.close()
         for key in list(st.session_state.keys()):
             del st.session_state[key]
+        st.query_params.clear()
         st.rerun()
 
-st.session_state.game_speed = st.sidebar.slider("Game Speed", 0.1, 3.0, st.session_state.game_speed, 0.1)
+if st.sidebar.button("⏭️ Skip to Next Wave", help="Fast-forward the match to the next enemy wave"):
+    sim.apply("skip_to_next_wave")
+    st.rerun()
+
+game_speed = st.sidebar.slider("Game Speed", 0.1, 3.0, snap.game_speed, 0.1)
+if game_speed != snap.game_speed:
+    sim.control(game_speed=game_speed)
 
 st.sidebar.markdown("---")
 st.sidebar.markdown("### 📊 Stats")
 
-# Real-time metrics that update without rerun
-metrics_placeholder = st.sidebar.empty()
-log_placeholder = st.sidebar.empty()
+# Real-time metrics, rerun on their own without the rest of the page
+@st.fragment(run_every=METRICS_REFRESH)
+def live_metrics():
+    sim = ensure_simulation()
+    with prof.span("metrics"):
+        snap = sim.read()
+        st.metric("💰 Resources", f"${int(snap.resources):,}")
+        st.metric("🏆 Score", f"{snap.score}")
+        st.metric("🌊 Wave", f"{snap.wave}")
+        st.metric("⏱️ Game Time", f"{int(snap.game_time)}s")
+
+with st.sidebar:
+    live_metrics()
 
 st.sidebar.markdown("---")
 st.sidebar.markdown("### 🏗️ Build Structures")
 
-# Build buttons
-structures = {
-    "🎯 Missile Silo": {"cost": 400, "desc": "Launch defensive missiles"},
-    "🛡️ SAM Site": {"cost": 600, "desc": "Anti-air defense (60% intercept)"},
-    "✈️ Airfield": {"cost": 800, "desc": "Deploy fighter jets"},
-    "📡 Radar Station": {"cost": 300, "desc": "+30% detection range"},
-    "🏭 Resource Depot": {"cost": 500, "desc": "+25% income boost"}
-}
-
-for name, info in structures.items():
+# Build buttons, one per unit type in units.json
+for build_type, unit in STRUCTURE_UNITS.items():
     colA, colB = st.sidebar.columns([3, 1])
     with colA:
-        if st.button(f"{name}", key=f"build_{name}", use_container_width=True):
-            build_type = name.split(" ")[1] + " " + name.split(" ")[2]
+        if st.button(f"{unit['icon']} {build_type}", key=f"build_{build_type}", help=unit.get('description'),
+                     use_container_width=True):
             st.session_state.build_mode = build_type if st.session_state.build_mode != build_type else None
             st.session_state.build_preview = None
             st.rerun()
     with colB:
-        st.caption(f"${info['cost']}")
+        st.caption(f"${unit['cost']}")
+
+# Layout lab - Monte Carlo stats for the current base, played out of process
+def start_lab(label, command, layout, type_name=None, **options):
+    future = lab_pool().submit(run_cli, command, layout, **options)
+    st.session_state.lab_job = {'future': future, 'label': label, 'type': type_name}
+    st.session_state.lab_error = None
+
+
+@st.fragment(run_every=LAB_REFRESH)
+def lab_progress():
+    """Wait for the running Layout Lab job; rerun the page with its result once it is done"""
+    job = st.session_state.lab_job
+    if not job['future'].done():
+        st.caption(f"⏳ {job['label']}")
+        return
+    st.session_state.lab_job = None
+    try:
+        result = job['future'].result()
+    except subprocess.CalledProcessError as e:
+        lines = (e.stderr or "").strip().splitlines()
+        st.session_state.lab_error = lines[-1] if lines else f"exited with status {e.returncode}"
+    else:
+        if job['type']:
+            result = result[0]
+            st.session_state.build_preview = {'type': job['type'], 'lat': result['site'][0], 'lon': result['site'][1]}
+        st.session_state.lab_result = result
+    st.rerun()
+
+
+with st.sidebar.expander("🧪 Layout Lab"):
+    lab_runs = st.number_input("Games", 20, 5000, 200, step=20)
+    lab_waves = st.number_input("Waves", 1, 30, 10)
+    layout = [(row['type'], row['lat'], row['lon']) for row in snap.structures.rows()]
+    busy = st.session_state.lab_job is not None
+    if st.button("Evaluate base", disabled=not layout or busy, use_container_width=True):
+        start_lab(f"Playing {lab_runs} games...", "evaluate", layout, runs=lab_runs, waves=lab_waves)
+    build_type = st.session_state.build_mode
+    if build_type and st.button(f"Suggest a site for {build_type}", disabled=busy, use_container_width=True):
+        start_lab(f"Trying {build_type} at {len(candidate_sites())} sites...", "suggest", layout, build_type,
+                  type=build_type, runs=max(lab_runs // 5, 10), waves=lab_waves, top=1)
+    if st.session_state.lab_job is not None:
+        lab_progress()
+    if st.session_state.lab_error:
+        st.error(f"Layout Lab failed: {st.session_state.lab_error}")
+    result = st.session_state.lab_result
+    if result:
+        st.caption(f"{result['runs']} games × {result['waves']} waves"
+                   + (f" with {result['layout'][-1][0]} at the suggested site" if 'site' in result else ""))
+        col_a, col_b = st.columns(2)
+        col_a.metric("Survival", f"{result['survival_rate']:.0%}", help="Share of structures standing at the end")
+        col_b.metric("Intercepts", f"{result['intercept_rate']:.0%}", help="Share of enemy missiles shot down")
+        st.line_chart(result['resources'], height=150)
+
+# Debug panel - per-phase timings from the sim thread and this session's renders
+def _phase_rows(profiler):
+    return [
+        {"phase": f"{profiler.name}/{phase}", "mean ms": round(t['mean_ms'], 2),
+         "p95 ms": round(t['p95_ms'], 2), "max ms": round(t['max_ms'], 2), "n": t['n']}
+        for phase, t in profiler.summary().items()
+    ]
+
+@st.fragment(run_every=DEBUG_REFRESH)
+def perf_panel():
+    sim = ensure_simulation()
+    tick = sim.profiler.summary().get("tick")
+    if tick:
+        budget = TICK_INTERVAL * 1000 / max(sim.read().game_speed, 0.1)
+        st.caption(f"Tick {tick['mean_ms']:.2f} ms avg, {tick['p95_ms']:.2f} ms p95 of a {budget:.0f} ms budget")
+    rows = _phase_rows(sim.profiler) + _phase_rows(prof)
+    if rows:
+        st.dataframe(rows, hide_index=True)
+    else:
+        st.caption("Collecting samples...")
+    counters = {**sim.profiler.counters(), **prof.counters()}
+    if counters:
+        st.caption(" • ".join(f"{name}: {value:,}" for name, value in counters.items()))
+
+st.sidebar.markdown("---")
+with st.sidebar.expander("🛠️ Debug"):
+    st.caption(f"Seed {sim.seed} • tick {snap.tick}")
+    st.download_button("Export replay", sim.export_replay,
+                       file_name=f"yuddhasphere-{sim.seed}-{snap.tick}.jsonl", mime="application/jsonl",
+                       help="Seed and command log - re-run with python -m yuddhasphere replay")
+    if SAVE_DIR and st.button("Save now", help=f"Autosaving to {SAVE_DIR}"):
+        sim.save()
+    if st.toggle("Profile ticks and renders", key="profiling"):
+        perf_panel()
+        footprint = session_bytes()
+        st.caption(f"Session memory {sum(footprint.values()) / 1024:,.0f} KB: "
+                   + ", ".join(f"{key} {size / 1024:,.0f}" for key, size in list(footprint.items())[:3]))
+        st.download_button("Export trace", lambda: export_trace(sim.profiler, prof),
+                           file_name="yuddhasphere-trace.json", mime="application/json",
+                           help="Chrome trace format - open in ui.perfetto.dev or chrome://tracing")
+        if st.button("Clear samples"):
+            sim.profiler.reset()
+            prof.reset()
 
 # ────────────────────────────────────────────────
 # Main Layout - Using Columns for Better Organization
 # ────────────────────────────────────────────────
 col_left, col_right = st.columns([3, 1])
 
-with col_left:
-    # Update metrics in sidebar through the placeholder
-    with metrics_placeholder.container():
-        st.metric("💰 Resources", f"${int(st.session_state.resources):,}")
-        st.metric("🏆 Score", f"{st.session_state.score}")
-        st.metric("🌊 Wave", f"{st.session_state.wave}")
-        st.metric("⏱️ Game Time", f"{int(st.session_state.game_time)}s")
-    
-    # Create map with current state
-    m = folium.Map(
-        location=st.session_state.map_center,
-        zoom_start=st.session_state.map_zoom,
-        tiles="cartodbpositron"
-    )
-    
-    # Player base
-    folium.Marker(
-        [st.session_state.player_lat, st.session_state.player_lon],
-        popup="🏠 Command Center",
-        tooltip="Your HQ",
-        icon=folium.Icon(color="darkblue", icon="flag", prefix="fa")
-    ).add_to(m)
-    
-    # Build radius
-    folium.Circle(
-        radius=MAX_BUILD_RADIUS_KM * 1000,
-        location=[st.session_state.player_lat, st.session_state.player_lon],
-        color="green", fill=True, fill_opacity=0.08,
-        popup=f"Construction Zone ({MAX_BUILD_RADIUS_KM}km radius)"
-    ).add_to(m)
-    
-    # Resource nodes
-    for node in st.session_state.resource_nodes:
-        folium.CircleMarker(
-            location=[node['lat'], node['lon']],
-            radius=8,
-            color="gold", fill=True, fill_color="yellow",
-            fill_opacity=0.6,
-            popup=f"💰 Resource Node\nResources: {node['resources']}"
-        ).add_to(m)
-    
-    # Structures
-    for s in st.session_state.structures:
-        health_pct = s['health'] / STRUCTURE_HEALTH[s['type']]
-        color = "green" if health_pct > 0.6 else "orange" if health_pct > 0.3 else "red"
-        
-        icons = {
-            "Missile Silo": "crosshairs",
-            "SAM Site": "shield-alt",
-            "Airfield": "plane",
-            "Radar Station": "satellite-dish",
-            "Resource Depot": "industry"
-        }
-        
-        folium.Marker(
-            [s['lat'], s['lon']],
-            popup=f"""
-            <b>{s['type']} #{s['id']}</b><br>
-            Health: {int(s['health'])}/{STRUCTURE_HEALTH[s['type']]}<br>
-            {f"Missiles: {s.get('missiles', 0)}" if s['type'] == "Missile Silo" else ""}
-            {f"Intercepts: {s.get('intercepts', 0)}" if s['type'] == "SAM Site" else ""}
-            """,
-            icon=folium.Icon(color=color, icon=icons[s['type']], prefix="fa")
-        ).add_to(m)
-    
-    # Incoming missiles with smooth interpolation
-    for inc in st.session_state.incoming_missiles:
-        progress = min(1.0, inc['progress'])
-        cur_lat = inc['start_lat'] + progress * (inc['target_lat'] - inc['start_lat'])
-        cur_lon = inc['start_lon'] + progress * (inc['target_lon'] - inc['start_lon'])
-        
-        folium.CircleMarker(
-            [cur_lat, cur_lon],
-            radius=10,
-            color="red", 
-            fill=True, 
-            fill_color="darkred",
-            fill_opacity=0.8,
-            popup=f"🚀 Enemy Missile\nProgress: {progress*100:.0f}%"
-        ).add_to(m)
-        
-        # Draw missile trail
-        folium.PolyLine(
-            locations=[[inc['start_lat'], inc['start_lon']], [cur_lat, cur_lon]],
-            color="red",
-            weight=2,
-            opacity=0.5
-        ).add_to(m)
-    
-    # Enemy aircraft
-    for enemy in st.session_state.enemy_aircraft:
-        folium.Marker(
-            [enemy['lat'], enemy['lon']],
-            popup=f"Enemy Bomber\nTarget: {enemy['target_type']}",
-            icon=folium.Icon(color="black", icon="plane", prefix="fa")
-        ).add_to(m)
-    
-    # Jets
-    for jet in st.session_state.jets:
-        if jet['status'] == 'patrolling':
-            folium.Marker(
-                [jet['lat'], jet['lon']],
-                popup=f"Fighter Jet #{jet['id']}\nMissiles: {jet['missiles_left']}\nFuel: {int(jet['fuel'])}%",
-                icon=folium.Icon(color="orange", icon="fighter-jet", prefix="fa")
-            ).add_to(m)
-    
-    # Build preview
-    if st.session_state.build_preview:
-        preview = st.session_state.build_preview
-        folium.Marker(
-            [preview['lat'], preview['lon']],
-            popup="👆 Click CONFIRM to build",
-            icon=folium.Icon(color="purple", icon="plus-circle", prefix="fa")
-        ).add_to(m)
-    
-    # Render the map
-    map_data = st_folium(
-        m, 
-        width=900, 
-        height=600, 
-        key="main_map",
-        returned_objects=["last_clicked", "bounds", "zoom", "center"]
-    )
-    
+@st.fragment(run_every=MAP_REFRESH)
+def live_map():
+    sim = ensure_simulation()
+    snap = sim.read()
+
+    # Send only what changed since the browser's last patch, culled to its viewport
+    prev = st.session_state.get("main_map") or {}
+    st.session_state.map_view.update(prev)
+    with prof.span("map build"):
+        patch = st.session_state.map_differ.patch(
+            map_features(snap, st.session_state.build_preview, st.session_state.map_view, st.session_state.render_cache),
+            prev.get("resync", 0),
+        )
+    prof.count("map upserts", len(patch['upsert']))
+    prof.count("map removes", len(patch['remove']))
+    if SESSION_MEMORY_MB:
+        enforce_memory_cap()
+    with prof.span("map component"):
+        map_data = _live_map_component(
+            patch=patch,
+            tiles=map_tiles(),
+            attribution=MAP_ATTRIBUTION,
+            center=st.session_state.map_center,
+            zoom=st.session_state.map_zoom,
+            height=600,
+            key="main_map",
+            default=None,
+        )
+
     # Handle map interactions
     if map_data:
-        if map_data.get("last_clicked"):
+        click_id = map_data.get("click_id", 0)
+        if map_data.get("last_clicked") and click_id != st.session_state.last_click_id:
+            st.session_state.last_click_id = click_id
             clat = map_data["last_clicked"]["lat"]
             clon = map_data["last_clicked"]["lng"]
-            
+
             # Build preview
             if st.session_state.build_mode:
                 st.session_state.build_preview = {
@@ -453,13 +356,27 @@ with col_left:
                     'lon': clon
                 }
                 st.rerun()
-        
+
         # Update map view state
         if map_data.get("center"):
             st.session_state.map_center = [map_data["center"]["lat"], map_data["center"]["lng"]]
         if map_data.get("zoom"):
             st.session_state.map_zoom = map_data["zoom"]
 
+with col_left:
+    live_map()
+
+@st.fragment(run_every=LOG_REFRESH)
+def event_log():
+    sim = ensure_simulation()
+    with prof.span("log"):
+        snap = sim.read()
+        st.subheader("📋 Event Log")
+        log_container = st.container(height=300, border=True)
+        with log_container:
+            for event in reversed(snap.log[-15:]):
+                st.markdown(format_event(event))
+
 with col_right:
     # Build confirmation panel
     if st.session_state.build_preview:
@@ -469,29 +386,15 @@ with col_right:
             st.write(f"Type: {preview['type']}")
             st.write(f"Location: {preview['lat']:.4f}, {preview['lon']:.4f}")
             st.write(f"Cost: ${COSTS[preview['type']]}")
-            
+            site_problem = site_error(snap, preview['lat'], preview['lon'])
+            if site_problem:
+                st.warning(site_problem)
+
             col_confirm, col_cancel = st.columns(2)
             with col_confirm:
-                if st.button("✅ Build", type="primary", use_container_width=True):
-                    cost = COSTS[preview['type']]
-                    if st.session_state.resources >= cost:
-                        st.session_state.resources -= cost
-                        sid = len(st.session_state.structures) + 1
-                        new_struct = {
-                            'id': sid,
-                            'type': preview['type'],
-                            'lat': preview['lat'],
-                            'lon': preview['lon'],
-                            'health': STRUCTURE_HEALTH[preview['type']],
-                            'created_at': time.time()
-                        }
-                        if preview['type'] == "Missile Silo":
-                            new_struct['missiles'] = 8
-                        elif preview['type'] == "SAM Site":
-                            new_struct['intercepts'] = 0
-                        
-                        st.session_state.structures.append(new_struct)
-                        add_log(f"Built {preview['type']} #{sid}", "success")
+                if st.button("✅ Build", type="primary", use_container_width=True, disabled=bool(site_problem)):
+                    sid = sim.apply("build", type_name=preview['type'], lat=preview['lat'], lon=preview['lon'])
+                    if sid is not None:
                         st.session_state.build_mode = None
                         st.session_state.build_preview = None
                         st.rerun()
@@ -501,103 +404,83 @@ with col_right:
                 if st.button("❌ Cancel", use_container_width=True):
                     st.session_state.build_preview = None
                     st.rerun()
-    
+
     # Structure management panel
-    if st.session_state.selected_structure:
-        s = st.session_state.selected_structure
+    if selected:
+        s = selected
         with st.container(border=True):
             st.subheader(f"{s['type']} #{s['id']}")
-            
+
             # Health bar
             health_pct = s['health'] / STRUCTURE_HEALTH[s['type']]
             st.progress(health_pct, text=f"Health: {int(s['health'])}/{STRUCTURE_HEALTH[s['type']]}")
-            
-            if s['type'] == "Missile Silo":
+
+            unit = STRUCTURE_UNITS[s['type']]
+            if unit.get('missiles'):
                 st.metric("Missiles", s.get('missiles', 0))
                 if st.button("Launch Missile", type="primary"):
-                    if s.get('missiles', 0) > 0:
-                        s['missiles'] -= 1
-                        add_log(f"Missile launched from Silo #{s['id']}", "warning")
-                        st.rerun()
-            
-            elif s['type'] == "Airfield":
-                active_jets = len([j for j in st.session_state.jets if j.get('home_airfield') == s['id']])
+                    sim.apply("launch_missile", sid=s['id'])
+                    st.rerun()
+
+            elif unit.get('jets'):
+                active_jets = snap.jets.count('home_airfield', s['id'])
                 st.metric("Active Jets", active_jets)
-                if st.button("Deploy Jet ($200)", type="secondary"):
-                    if st.session_state.resources >= 200:
-                        st.session_state.resources -= 200
-                        st.session_state.jets.append({
-                            'id': len(st.session_state.jets) + 1,
-                            'lat': s['lat'],
-                            'lon': s['lon'],
-                            'missiles_left': 6,
-                            'status': 'patrolling',
-                            'home_airfield': s['id'],
-                            'fuel': 100
-                        })
-                        add_log(f"Jet deployed from Airfield #{s['id']}", "success")
-                        st.rerun()
-            
-            elif s['type'] == "SAM Site":
+                if st.button(f"Deploy Jet (${JET_COST})", type="secondary"):
+                    sim.apply("deploy_jet", sid=s['id'])
+                    st.rerun()
+
+            elif unit.get('intercept_rate'):
                 st.metric("Intercepts", s.get('intercepts', 0))
                 st.caption("Auto-defends against missiles")
-            
+
             # Repair button
             if s['health'] < STRUCTURE_HEALTH[s['type']]:
                 repair_cost = int((STRUCTURE_HEALTH[s['type']] - s['health']) * 2)
                 if st.button(f"Repair (${repair_cost})", type="secondary"):
-                    if st.session_state.resources >= repair_cost:
-                        st.session_state.resources -= repair_cost
-                        s['health'] = STRUCTURE_HEALTH[s['type']]
-                        add_log(f"Repaired {s['type']} #{s['id']}", "success")
-                        st.rerun()
-            
-            if st.button("Demolish (50% refund)", type="primary"):
-                refund = int(COSTS[s['type']] * 0.5)
-                st.session_state.resources += refund
-                st.session_state.structures.remove(s)
-                add_log(f"Demolished {s['type']} #{s['id']}", "warning")
+                    sim.apply("repair", sid=s['id'])
+                    st.rerun()
+
+            if st.button(f"Demolish ({DEMOLISH_REFUND:.0%} refund)", type="primary"):
+                sim.apply("demolish", sid=s['id'])
                 st.session_state.selected_structure = None
                 st.rerun()
-            
+
             if st.button("Close Panel"):
                 st.session_state.selected_structure = None
                 st.rerun()
-    
-    # Event log
-    st.subheader("📋 Event Log")
-    log_container = st.container(height=300, border=True)
-    with log_container:
-        for line in reversed(st.session_state.log[-15:]):
-            st.markdown(line)
 
-# ────────────────────────────────────────────────
-# Run Game Tick (Only if not paused)
-# ────────────────────────────────────────────────
-if not st.session_state.paused:
-    game_tick()
+    # Event log
+    event_log()
 
 # ────────────────────────────────────────────────
 # Status Display at Bottom
 # ────────────────────────────────────────────────
 st.divider()
-col_status1, col_status2, col_status3, col_status4 = st.columns(4)
-with col_status1:
-    st.metric("Active Threats", 
-              f"{len(st.session_state.incoming_missiles) + len(st.session_state.enemy_aircraft)}",
-              help="Missiles + Enemy Aircraft")
-with col_status2:
-    st.metric("Defense Systems", 
-              f"{len([s for s in st.session_state.structures if s['type'] in ['SAM Site', 'Missile Silo']])}",
-              help="SAM Sites + Missile Silos")
-with col_status3:
-    st.metric("Resource Flow", 
-              f"${int(BASE_INCOME * (1 + len([s for s in st.session_state.structures if s['type'] == 'Resource Depot']) * 0.25) / 3):,}/s",
-              help="Income per second")
-with col_status4:
-    next_wave = max(0, 30 - (time.time() - st.session_state.last_wave_spawn))
-    st.metric("Next Wave", 
-              f"{int(next_wave)}s",
-              help="Time until next enemy wave")
-
-st.caption("GPS RTS Live • Real-time Strategy • v4.0 • Updates every 2 seconds")
+
+@st.fragment(run_every=STATUS_REFRESH)
+def status_row():
+    sim = ensure_simulation()
+    snap = sim.read()
+    col_status1, col_status2, col_status3, col_status4 = st.columns(4)
+    with col_status1:
+        st.metric("Active Threats",
+                  f"{threat_count(snap)}",
+                  help="Missiles + Enemy Aircraft on radar")
+    with col_status2:
+        st.metric("Defense Systems",
+                  f"{defense_count(snap)}",
+                  help="SAM Sites + Missile Silos")
+    with col_status3:
+        st.metric("Resource Flow",
+                  f"${int(income_rate(snap)):,}/s",
+                  help="Income per second")
+    with col_status4:
+        next_wave = max(0, WAVE_INTERVAL - (snap.game_time - snap.last_wave_spawn))
+        st.metric("Next Wave",
+                  f"{int(next_wave)}s",
+                  help="Time until next enemy wave")
+
+status_row()
+
+refresh = (METRICS_REFRESH, MAP_REFRESH, LOG_REFRESH, STATUS_REFRESH)
+st.caption(f"GPS RTS Live • Real-time Strategy • v4.0 • Live panels refresh every {min(refresh):g}-{max(refresh):g} seconds")
@@ -0,0 +1,52 @@
+"""Headless checks of app.py through Streamlit's testing API"""
+import os
+import time
+
+import pytest
+from streamlit.testing.v1 import AppTest, local_script_runner
+
+from yuddhasphere import sim as simulation
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+
+
+@pytest.fixture
+def app(monkeypatch):
+    """A session of app.py with its match as a thread in this process and no autosave"""
+    monkeypatch.setenv("YUDDHASPHERE_MATCH_PROCESSES", "0")
+    monkeypatch.setenv("YUDDHASPHERE_SAVE_DIR", "")
+    at = AppTest.from_file(APP_PATH, default_timeout=30)
+    at.query_params["game"] = "1"
+    at.run()
+    yield at
+    at.session_state['sim'].stop()
+
+
+def run_fragments(at, monkeypatch):
+    """Rerun only the page's fragments, the way their run_every timers do"""
+    fragment_ids = list(at._fragment_storage._fragments)
+    rerun_data = local_script_runner.RerunData
+    with monkeypatch.context() as m:
+        m.setattr(local_script_runner, "RerunData",
+                  lambda **kwargs: rerun_data(fragment_id_queue=fragment_ids, is_auto_rerun=True, **kwargs))
+        at.run()
+    return next(float(m.value.rstrip("s")) for m in at.metric if m.label == "⏱️ Game Time")
+
+
+def test_fragments_resume_an_idled_out_match(app, monkeypatch):
+    sim = app.session_state['sim']
+    with monkeypatch.context() as m:
+        m.setattr(simulation, "SIM_IDLE_TIMEOUT", 0.1)
+        sim.join(timeout=5)
+    assert not sim.is_alive()
+    stopped = sim.snapshot.game_time
+
+    deadline = time.monotonic() + 10
+    game_time = run_fragments(app, monkeypatch)
+    while game_time <= stopped and time.monotonic() < deadline:
+        time.sleep(0.5)
+        game_time = run_fragments(app, monkeypatch)
+
+    assert not app.exception
+    assert app.session_state['sim'] is not sim
+    assert game_time > stopped
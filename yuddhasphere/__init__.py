@@ -0,0 +1,32 @@
+"""YuddhaSphere game engine.
+
+The Streamlit UI lives in ``app.py``; this package has no UI imports, so
+simulations, tests and benchmarks run headless.
+"""
+from .engine import (
+    COSTS,
+    STRUCTURE_HEALTH,
+    STRUCTURE_TYPES,
+    TICK_INTERVAL,
+    GameState,
+    Snapshot,
+    build_structure,
+    game_tick,
+    remove_structures,
+    take_snapshot,
+)
+from .geo import haversine
+
+__all__ = [
+    "COSTS",
+    "STRUCTURE_HEALTH",
+    "STRUCTURE_TYPES",
+    "TICK_INTERVAL",
+    "GameState",
+    "Snapshot",
+    "build_structure",
+    "game_tick",
+    "haversine",
+    "remove_structures",
+    "take_snapshot",
+]
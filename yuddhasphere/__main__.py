@@ -0,0 +1,271 @@
+"""Command-line entry point: ``python -m yuddhasphere run --ticks 600``"""
+import argparse
+import json
+import sys
+import time
+
+from . import bench, commands, evaluate, loadtest, replay, savegame, server, tiles
+from .engine import STRUCTURE_TYPES, TICK_INTERVAL, GameState, game_tick, site_error
+from .eventlog import JsonlSink, format_event
+from .profiling import Profiler
+
+
+def _parse_build(spec):
+    """'SAM Site@19.1,72.9' -> ('SAM Site', 19.1, 72.9)"""
+    try:
+        type_name, coords = spec.split("@")
+        lat, lon = (float(v) for v in coords.split(","))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected TYPE@LAT,LON, got {spec!r}")
+    if type_name not in STRUCTURE_TYPES:
+        raise argparse.ArgumentTypeError(f"unknown structure type {type_name!r}")
+    return type_name, lat, lon
+
+
+def _report(state, args, ticks, elapsed, prof):
+    if args.log:
+        for event in state.log:
+            print(format_event(event))
+    print(f"game_time={state.game_time:.0f}s wave={state.wave} resources={int(state.resources)} "
+          f"score={state.score} intercepted={state.enemy_missiles_intercepted} "
+          f"destroyed={state.structures_destroyed}")
+    print(f"structures={len(state.structures)} missiles={len(state.incoming_missiles)} "
+          f"bombers={len(state.enemy_aircraft)} jets={len(state.jets)}")
+    if ticks is None:
+        return
+    print(f"{ticks} ticks in {elapsed:.3f}s ({ticks / max(elapsed, 1e-9):,.0f} ticks/s)")
+    if prof.enabled:
+        for phase, t in prof.summary().items():
+            print(f"  {phase:<10}{t['mean_ms']:>9.3f} ms avg{t['p95_ms']:>9.3f} ms p95{t['max_ms']:>9.3f} ms max")
+
+
+def run(args):
+    state = GameState(seed=args.seed)
+    state.wave = args.wave
+    if args.events:
+        state.log.sink = JsonlSink(args.events)
+    for type_name, lat, lon in args.build:
+        if commands.apply(state, "build", type_name=type_name, lat=lat, lon=lon) is None:
+            reason = site_error(state, lat, lon) or "not enough resources"
+            print(f"cannot build {type_name} at {lat},{lon}: {reason}", file=sys.stderr)
+
+    saver = savegame.SaveWriter(args.save, dt=args.dt) if args.save else None
+    prof = Profiler("sim", enabled=args.profile, window=args.ticks)
+    start = time.perf_counter()
+    for _ in range(args.ticks):
+        if saver:
+            saver.update(state)
+        game_tick(state, args.dt, prof)
+    if saver:
+        saver.keyframe(state)
+    if args.events:
+        state.log.sink.flush()
+    elapsed = time.perf_counter() - start
+
+    _report(state, args, args.ticks, elapsed, prof)
+    if args.record:
+        recording = replay.record(state, args.dt, args.wave)
+        replay.save(recording, args.record)
+        # Round trip: the saved file must reproduce this run, or it is no use as a recording
+        replayed = replay.digest(replay.replay(replay.load(args.record)))
+        if replayed != recording.digest:
+            print(f"DIVERGED: {args.record} replays to digest {replayed}, the run ended at {recording.digest}")
+            return 1
+        print(f"recorded seed {state.seed} to {args.record} (replay checked, digest {recording.digest})")
+    return 0
+
+
+def run_load(args):
+    keyframes, latest = savegame.timeline(args.file)
+    print(f"{args.file}: ticks 0-{latest}, keyframes at {keyframes}")
+    start = time.perf_counter()
+    state = savegame.load(args.file, args.tick)
+    elapsed = time.perf_counter() - start
+    _report(state, args, None, elapsed, None)
+    print(f"loaded tick {state.tick} in {elapsed * 1e3:.1f} ms, digest {replay.digest(state)}")
+    return 0
+
+
+def run_replay(args):
+    try:
+        recording = replay.load(args.file)
+    except ValueError as e:
+        print(f"{args.file}: {e}", file=sys.stderr)
+        return 1
+    ticks = recording.ticks if args.ticks is None else args.ticks
+    prof = Profiler("sim", enabled=args.profile, window=max(ticks, 1))
+    start = time.perf_counter()
+    state = replay.replay(recording, ticks, prof)
+    elapsed = time.perf_counter() - start
+
+    _report(state, args, ticks, elapsed, prof)
+    if ticks != recording.ticks:
+        return 0
+    if replay.digest(state) != recording.digest:
+        print(f"DIVERGED: digest {replay.digest(state)}, recorded {recording.digest}")
+        return 1
+    print(f"digest {recording.digest} matches the recording")
+    return 0
+
+
+def _layout(args):
+    layout = list(args.build)
+    if args.layout:
+        with (sys.stdin if args.layout == "-" else open(args.layout)) as f:
+            layout += [tuple(entry) for entry in json.load(f)]
+    return layout
+
+
+def _print_evaluation(result):
+    print(f"survival {result['survival_rate']:.1%}  flawless {result['flawless_rate']:.1%}  "
+          f"intercepts {result['intercept_rate']:.1%}  lost {result['structures_lost']:.2f} structures/game")
+    print("resources by wave: " + " ".join(f"{v:,.0f}" for v in result['resources']['mean']))
+
+
+def run_evaluate(args):
+    start = time.perf_counter()
+    result = evaluate.evaluate(_layout(args), args.runs, args.waves, args.seed, args.workers)
+    if args.json:
+        print(json.dumps(result))
+        return 0
+    print(f"{args.runs} games x {args.waves} waves in {time.perf_counter() - start:.1f}s")
+    _print_evaluation(result)
+    return 0
+
+
+def run_suggest(args):
+    start = time.perf_counter()
+    results = evaluate.suggest(_layout(args), args.type, args.runs, args.waves, args.seed, args.workers,
+                               top=args.top)
+    if args.json:
+        print(json.dumps(results))
+        return 0
+    print(f"ranked {len(evaluate.candidate_sites())} sites in {time.perf_counter() - start:.1f}s")
+    for rank, result in enumerate(results, 1):
+        lat, lon = result['site']
+        print(f"{rank}. {args.type}@{lat:.4f},{lon:.4f}")
+        _print_evaluation(result)
+    return 0
+
+
+def run_serve(args):
+    # The key comes on stdin so it stays out of the process list
+    server.serve_match(args.seed, args.save, bytes.fromhex(sys.stdin.readline().strip()))
+    return 0
+
+
+def run_tiles(args):
+    cache = tiles.TileCache(args.dir, upstream=None if args.offline else tiles.MAP_TILES,
+                            max_bytes=args.max_mb * 1024 * 1024)
+    if args.action == "seed":
+        wanted = tiles.seed_tiles()
+        start = time.perf_counter()
+        failed = cache.seed(wanted)
+        print(f"{len(wanted) - failed}/{len(wanted)} tiles cached in {time.perf_counter() - start:.1f}s "
+              f"({cache.misses - failed} fetched), {len(cache)} tiles / {cache.bytes / 2 ** 20:.1f} MB in {args.dir}")
+        return 1 if failed else 0
+    tile_server = tiles.TileServer(cache, args.host, args.port)
+    print(f"serving {len(cache)} tiles from {args.dir} on port {tile_server.port}"
+          f"{' (offline)' if args.offline else ''}; Ctrl+C to stop")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        tile_server.close()
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m yuddhasphere", description="YuddhaSphere headless tools")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+
+    p = subcommands.add_parser("run", help="run the simulation headless for N ticks")
+    p.add_argument("--ticks", type=int, default=600)
+    p.add_argument("--dt", type=float, default=TICK_INTERVAL, help="game seconds per tick")
+    p.add_argument("--wave", type=int, default=1, help="starting wave")
+    p.add_argument("--seed", type=int)
+    p.add_argument("--build", type=_parse_build, action="append", default=[], metavar="TYPE@LAT,LON",
+                   help="build a structure before the first tick, e.g. 'SAM Site@19.1,72.9' (repeatable)")
+    p.add_argument("--log", action="store_true", help="print the event log at the end")
+    p.add_argument("--profile", action="store_true", help="print per-phase tick timings")
+    p.add_argument("--record", metavar="FILE", help="save a replayable recording of the run")
+    p.add_argument("--save", metavar="FILE", help="write keyframes and deltas to a save file as it runs")
+    p.add_argument("--events", metavar="FILE", help="append every game event to a JSON-lines file")
+    p.set_defaults(func=run)
+
+    p = subcommands.add_parser("load", help="load a save file at any tick")
+    p.add_argument("file")
+    p.add_argument("--tick", type=int, help="tick to rebuild (default: the latest)")
+    p.add_argument("--log", action="store_true", help="print the event log")
+    p.set_defaults(func=run_load)
+
+    p = subcommands.add_parser("replay", help="re-run a recorded game headless and check it reproduces")
+    p.add_argument("file")
+    p.add_argument("--ticks", type=int, help="stop early (default: the recording's length)")
+    p.add_argument("--log", action="store_true", help="print the event log at the end")
+    p.add_argument("--profile", action="store_true", help="print per-phase tick timings")
+    p.set_defaults(func=run_replay)
+
+    for name, help in (("evaluate", "Monte Carlo survival/intercept stats for a defense layout"),
+                       ("suggest", "rank candidate sites for one more structure")):
+        p = subcommands.add_parser(name, help=help)
+        p.add_argument("--build", type=_parse_build, action="append", default=[], metavar="TYPE@LAT,LON",
+                       help="structure in the layout (repeatable)")
+        p.add_argument("--layout", metavar="JSON", help="layout file of [type, lat, lon] entries ('-' for stdin)")
+        p.add_argument("--runs", type=int, default=1000 if name == "evaluate" else 200, help="seeded games per layout")
+        p.add_argument("--waves", type=int, default=10)
+        p.add_argument("--seed", type=int, default=0)
+        p.add_argument("--workers", type=int, help="worker processes (default: every core)")
+        p.add_argument("--json", action="store_true", help="print the result as JSON")
+        if name == "suggest":
+            p.add_argument("--type", required=True, choices=STRUCTURE_TYPES, help="structure to place")
+            p.add_argument("--top", type=int, default=5)
+            p.set_defaults(func=run_suggest)
+        else:
+            p.set_defaults(func=run_evaluate)
+
+    p = subcommands.add_parser("serve", help="host one match for app sessions (started by the app)")
+    p.add_argument("seed", type=int)
+    p.add_argument("--save", metavar="FILE", help="autosave file; resumed from when it exists")
+    p.set_defaults(func=run_serve)
+
+    p = subcommands.add_parser("tiles", help="seed or serve the local map tile cache")
+    p.add_argument("action", choices=["seed", "serve"])
+    p.add_argument("--dir", default=tiles.TILE_DIR, help="cache directory (default: the app's static/tiles)")
+    p.add_argument("--max-mb", type=int, default=tiles.TILE_CACHE_BYTES // 2 ** 20, help="cache size cap")
+    p.add_argument("--offline", action="store_true", help="never fetch from the tile CDN; misses are 404s")
+    p.add_argument("--host", default="127.0.0.1", help="address to serve on ('' for all interfaces)")
+    p.add_argument("--port", type=int, default=tiles.TILE_PORT)
+    p.set_defaults(func=run_tiles)
+
+    p = subcommands.add_parser("bench", help="run the benchmark scenarios")
+    p.add_argument("--scenario", action="append", choices=sorted(bench.SCENARIOS),
+                   help="scenario to run (repeatable; default all)")
+    p.add_argument("--ticks", type=int, default=300)
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--no-memory", action="store_true", help="skip the tracemalloc peak-memory pass")
+    p.add_argument("--out", help="write the results as JSON")
+    p.add_argument("--compare", metavar="JSON", help="compare against an earlier --out file")
+    p.add_argument("--threshold", type=float, default=0.10, help="relative change flagged as a regression")
+    p.add_argument("--fail-on-regression", action="store_true", help="exit 1 when --compare finds a regression")
+    p.set_defaults(func=bench.main)
+
+    p = subcommands.add_parser("loadtest", help="drive many headless app sessions and measure each one")
+    p.add_argument("--sessions", type=int, action="append", help="concurrent sessions (repeatable; default 1, 4, 16)")
+    p.add_argument("--rounds", type=int, default=20, help="reruns per session")
+    p.add_argument("--builds", type=int, default=5, help="rounds that build a structure")
+    p.add_argument("--waves", type=int, default=3, help="rounds after the builds that skip to the next wave")
+    p.add_argument("--shared", action="store_true", help="put every session in one match")
+    p.add_argument("--processes", action="store_true", help="run matches as server processes (CPU then excludes them)")
+    p.add_argument("--compact", action="store_true", help="compact session caches")
+    p.add_argument("--cap-mb", type=float, default=0, help="per-session memory cap")
+    p.add_argument("--seed", type=int, default=0, help="first match seed")
+    p.add_argument("--out", help="write the results as JSON")
+    p.set_defaults(func=loadtest.main)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
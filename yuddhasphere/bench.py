@@ -0,0 +1,230 @@
+"""Scripted benchmark scenarios for the simulation and map pipeline.
+
+Each scenario seeds the RNGs, sets up a world and runs a fixed number of
+ticks. The results are plain dicts that can be saved as JSON and compared
+between commits::
+
+    python -m yuddhasphere bench --out before.json
+    python -m yuddhasphere bench --compare before.json
+"""
+import json
+import math
+import os
+import platform
+import subprocess
+import time
+import tracemalloc
+from collections import namedtuple
+from datetime import datetime, timezone
+
+import numpy as np
+
+from .engine import (
+    MAX_BUILD_RADIUS_KM, STRUCTURE_TYPES, TICK_INTERVAL,
+    GameState, build_structure, game_tick, launch_missile, spawn_bomber, take_snapshot,
+)
+from .mapview import MapDiffer, map_features
+
+Scenario = namedtuple('Scenario', 'description setup per_wave')
+
+# Metrics compared by --compare, and whether bigger is better
+METRICS = {
+    'ticks_per_s': True,
+    'tick_p50_ms': False,
+    'tick_p99_ms': False,
+    'map_build_ms': False,
+    'map_payload_kb': False,
+    'peak_mem_mb': False,
+}
+
+
+def _scatter(state, count, types=STRUCTURE_TYPES, max_km=MAX_BUILD_RADIUS_KM):
+    """Build ``count`` structures uniformly over the construction disc"""
+    for _ in range(count):
+        r = max_km * math.sqrt(state.rng.random())
+        angle = state.rng.uniform(0, 2 * math.pi)
+        lat = state.player_lat + (r / 111) * math.cos(angle)
+        lon = state.player_lon + (r / (111 * math.cos(math.radians(state.player_lat)))) * math.sin(angle)
+        build_structure(state, types[state.rng.integers(len(types))], lat, lon)
+
+
+def _sam_belt(state, count=300, radius_km=35):
+    for k in range(count):
+        angle = 2 * math.pi * k / count
+        lat = state.player_lat + (radius_km / 111) * math.cos(angle)
+        lon = state.player_lon + (radius_km / (111 * math.cos(math.radians(state.player_lat)))) * math.sin(angle)
+        build_structure(state, "SAM Site", lat, lon)
+
+
+def _salvo(count):
+    def per_wave(state):
+        for _ in range(count):
+            launch_missile(state, state.game_time)
+    return per_wave
+
+
+def _setup(wave=1, structures=0, then=None):
+    def setup(state):
+        state.wave = wave
+        _scatter(state, structures)
+        if then:
+            then(state)
+    return setup
+
+
+def _bomber_swarm(state):
+    for _ in range(400):
+        spawn_bomber(state)
+    for _ in range(60):
+        state.jets.spawn(lat=state.player_lat, lon=state.player_lon, missiles_left=6,
+                         status='patrolling', home_airfield=0, fuel=100)
+
+
+SCENARIOS = {
+    'wave1': Scenario("Fresh game, 10 structures", _setup(1, 10), None),
+    'wave50': Scenario("Starts at wave 50, 10 structures", _setup(50, 10), None),
+    'base2000': Scenario("Wave 10 against 2,000 structures", _setup(10, 2000), None),
+    'sam_belt': Scenario("300-SAM belt, 200-missile salvo every wave",
+                         _setup(10, 50, _sam_belt), _salvo(200)),
+    'bomber_swarm': Scenario("400 bombers and 60 jets over 500 structures",
+                             _setup(5, 500, _bomber_swarm), None),
+}
+
+
+def _entity_counts(state):
+    return {
+        'structures': len(state.structures),
+        'missiles': len(state.incoming_missiles),
+        'bombers': len(state.enemy_aircraft),
+        'jets': len(state.jets),
+    }
+
+
+def _new_world(scenario, seed):
+    state = GameState(seed=seed)
+    scenario.setup(state)
+    return state
+
+
+def _step(state, scenario, wave):
+    """One tick, plus the scenario's per-wave script; returns (ns spent in game_tick, wave)"""
+    start = time.perf_counter_ns()
+    game_tick(state, TICK_INTERVAL)
+    elapsed = time.perf_counter_ns() - start
+    if scenario.per_wave and state.wave != wave:
+        scenario.per_wave(state)
+    return elapsed, state.wave
+
+
+def run_scenario(name, ticks=300, seed=0, map_every=50, memory=True):
+    """Run one scenario and return its metrics"""
+    scenario = SCENARIOS[name]
+    state = _new_world(scenario, seed)
+    latencies = np.empty(ticks)
+    map_ms, payload = [], []
+    wave = state.wave
+    for k in range(ticks):
+        latencies[k], wave = _step(state, scenario, wave)
+        if k % map_every == 0:
+            # Worst case: a full keyframe with no culling or cache
+            start = time.perf_counter()
+            body = json.dumps(MapDiffer().patch(map_features(take_snapshot(state))))
+            map_ms.append((time.perf_counter() - start) * 1e3)
+            payload.append(len(body))
+
+    result = {
+        'description': scenario.description,
+        'ticks': ticks,
+        'ticks_per_s': round(ticks / (latencies.sum() / 1e9), 1),
+        'tick_p50_ms': round(float(np.percentile(latencies, 50)) / 1e6, 3),
+        'tick_p99_ms': round(float(np.percentile(latencies, 99)) / 1e6, 3),
+        'tick_max_ms': round(float(latencies.max()) / 1e6, 3),
+        'map_build_ms': round(float(np.mean(map_ms)), 3),
+        'map_payload_kb': round(float(np.mean(payload)) / 1024, 1),
+        'final': _entity_counts(state),
+    }
+
+    # Separate pass - tracemalloc slows everything down, so it must not touch the timings
+    if memory:
+        tracemalloc.start()
+        state = _new_world(scenario, seed)
+        wave = state.wave
+        for _ in range(ticks):
+            _, wave = _step(state, scenario, wave)
+        take_snapshot(state)
+        result['peak_mem_mb'] = round(tracemalloc.get_traced_memory()[1] / 2 ** 20, 2)
+        tracemalloc.stop()
+    return result
+
+
+def _commit():
+    try:
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))  # Not the caller's cwd
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True, cwd=root).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(names=None, ticks=300, seed=0, memory=True, progress=None):
+    """Run the named scenarios (default: all) and return a JSON-ready report"""
+    results = {}
+    for name in names or SCENARIOS:
+        if progress:
+            progress(name)
+        results[name] = run_scenario(name, ticks=ticks, seed=seed, memory=memory)
+    return {
+        'commit': _commit(),
+        'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'seed': seed,
+        'scenarios': results,
+    }
+
+
+def format_report(report):
+    lines = [f"{'scenario':<14}{'ticks/s':>10}{'p50 ms':>9}{'p99 ms':>9}{'map ms':>9}{'map KB':>9}{'peak MB':>9}"]
+    for name, r in report['scenarios'].items():
+        lines.append(f"{name:<14}{r['ticks_per_s']:>10,.0f}{r['tick_p50_ms']:>9.2f}{r['tick_p99_ms']:>9.2f}"
+                     f"{r['map_build_ms']:>9.1f}{r['map_payload_kb']:>9.1f}{r.get('peak_mem_mb', float('nan')):>9.1f}")
+    return "\n".join(lines)
+
+
+def compare_reports(old, new, threshold=0.10):
+    """Per-metric relative change between two reports; returns (lines, regressions)"""
+    lines, regressions = [], []
+    for name, r in new['scenarios'].items():
+        before = old['scenarios'].get(name)
+        if not before:
+            continue
+        for metric, higher_is_better in METRICS.items():
+            if metric not in r or not before.get(metric):
+                continue
+            change = (r[metric] - before[metric]) / before[metric]
+            worse = -change if higher_is_better else change
+            flag = ""
+            if worse > threshold:
+                flag = "  REGRESSION"
+                regressions.append((name, metric, change))
+            lines.append(f"{name:<14}{metric:<16}{before[metric]:>12,.3f} -> {r[metric]:>12,.3f}  {change:+7.1%}{flag}")
+    return lines, regressions
+
+
+def main(args):
+    report = run_benchmarks(args.scenario, ticks=args.ticks, seed=args.seed, memory=not args.no_memory,
+                            progress=lambda name: print(f"running {name}...", flush=True))
+    print(format_report(report))
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"wrote {args.out}")
+    if args.compare:
+        with open(args.compare) as f:
+            old = json.load(f)
+        lines, regressions = compare_reports(old, report, args.threshold)
+        print(f"\nvs {args.compare} (commit {old.get('commit')})")
+        print("\n".join(lines))
+        if regressions and args.fail_on_regression:
+            return 1
+    return 0
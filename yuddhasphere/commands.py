@@ -0,0 +1,136 @@
+"""Player commands.
+
+Everything a player does to the world goes through ``apply``, which runs
+the command and appends it to ``state.command_log`` with the tick it ran
+after. Together with ``state.seed`` that log is enough to replay a game
+(see ``yuddhasphere.replay``). Commands take entity IDs, never slots, and
+return None when they are refused. ``fast_forward`` and
+``skip_to_next_wave`` advance the clock themselves, so they are logged at
+the tick they started from.
+"""
+import numpy as np
+
+from .engine import (
+    COSTS, STRUCTURE_HEALTH, STRUCTURE_TYPES, WAVE_INTERVAL, build_structure, fast_forward as _fast_forward,
+    log_event, remove_structures, site_error,
+)
+from .units import JET, LAUNCHES_JETS, START_MISSILES
+
+JET_COST = JET['cost']
+DEMOLISH_REFUND = 0.5
+
+
+def _structure(state, sid, capable=None):
+    """Slot of structure ``sid``; with ``capable`` (a per-type-code bool array) only if its type qualifies"""
+    slot = state.structures.slot(sid)
+    if slot is None:
+        return None
+    if capable is not None and not capable[state.structures['type'][slot]]:
+        return None
+    return slot
+
+
+def build(state, type_name, lat, lon):
+    """Pay for and build a structure on a valid site (see ``engine.site_error``); returns its ID"""
+    cost = COSTS[type_name]
+    if state.resources < cost or site_error(state, lat, lon) is not None:
+        return None
+    state.resources -= cost
+    sid = build_structure(state, type_name, lat, lon)
+    log_event(state, 'built', type_name, sid)
+    return sid
+
+
+def demolish(state, sid):
+    """Remove a structure for a partial refund; returns the refund"""
+    slot = _structure(state, sid)
+    if slot is None:
+        return None
+    type_name = STRUCTURE_TYPES[state.structures['type'][slot]]
+    refund = int(COSTS[type_name] * DEMOLISH_REFUND)
+    state.resources += refund
+    remove_structures(state, [slot])
+    log_event(state, 'demolished', type_name, sid)
+    return refund
+
+
+def repair(state, sid):
+    """Restore a structure to full health; returns the cost"""
+    slot = _structure(state, sid)
+    if slot is None:
+        return None
+    type_name = STRUCTURE_TYPES[state.structures['type'][slot]]
+    cost = int((STRUCTURE_HEALTH[type_name] - state.structures['health'][slot]) * 2)
+    if cost <= 0 or state.resources < cost:
+        return None
+    state.resources -= cost
+    state.structures['health'][slot] = STRUCTURE_HEALTH[type_name]
+    state.structures.touch([slot])
+    log_event(state, 'repaired', type_name, sid)
+    return cost
+
+
+def deploy_jet(state, sid):
+    """Launch a jet from an Airfield (or any type with ``jets``); returns the jet's ID"""
+    slot = _structure(state, sid, LAUNCHES_JETS)
+    if slot is None or state.resources < JET_COST:
+        return None
+    state.resources -= JET_COST
+    jid = state.jets.spawn(
+        lat=state.structures['lat'][slot],
+        lon=state.structures['lon'][slot],
+        missiles_left=JET['missiles'],
+        status='patrolling',
+        home_airfield=sid,
+        fuel=JET['fuel'],
+    )
+    log_event(state, 'jet_deployed', STRUCTURE_TYPES[state.structures['type'][slot]], sid)
+    return jid
+
+
+def launch_missile(state, sid):
+    """Fire one of a Missile Silo's (or any stocked type's) missiles; returns the missiles left"""
+    slot = _structure(state, sid, START_MISSILES > 0)
+    if slot is None or state.structures['missiles'][slot] <= 0:
+        return None
+    state.structures['missiles'][slot] -= 1
+    state.structures.touch([slot])
+    log_event(state, 'missile_launched', STRUCTURE_TYPES[state.structures['type'][slot]], sid)
+    return int(state.structures['missiles'][slot])
+
+
+def fast_forward(state, seconds):
+    """Skip ``seconds`` of game time in coarse steps; returns the steps taken"""
+    if seconds <= 0:
+        return None
+    return _fast_forward(state, seconds)
+
+
+def skip_to_next_wave(state):
+    """Fast-forward to the moment the next wave spawns; returns the seconds skipped"""
+    seconds = state.last_wave_spawn + WAVE_INTERVAL - state.game_time
+    if seconds <= 0:
+        return None
+    _fast_forward(state, seconds)
+    log_event(state, 'skipped', seconds, state.wave)
+    return seconds
+
+
+COMMANDS = {
+    'build': build,
+    'demolish': demolish,
+    'repair': repair,
+    'deploy_jet': deploy_jet,
+    'launch_missile': launch_missile,
+    'fast_forward': fast_forward,
+    'skip_to_next_wave': skip_to_next_wave,
+}
+
+
+def apply(state, command, **kwargs):
+    """Run a command against the state and record it in the command log"""
+    kwargs = {k: v.item() if isinstance(v, np.generic) else v for k, v in kwargs.items()}
+    tick = state.tick  # Fast-forwards move the clock; replays must start them from the same tick
+    result = COMMANDS[command](state, **kwargs)
+    state.command_log.append((tick, command, kwargs))
+    return result
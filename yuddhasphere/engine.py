@@ -0,0 +1,514 @@
+"""Game rules and state: unit tables, waves, and the simulation step.
+
+Pure Python + NumPy; nothing here touches Streamlit, so the engine can be
+driven headless (see ``python -m yuddhasphere``).
+"""
+from collections import namedtuple
+from types import MappingProxyType
+
+import numpy as np
+
+from .entities import EntityStore
+from .eventlog import EventLog
+from .events import EventScheduler
+from .geo import CoverageRaster, SpatialGrid, haversine, pairs_within, zone_windows
+from .geography import territory
+from .profiling import Profiler
+from .units import (
+    BASE, BOMBER, BOMBER_TARGETS, DEFENSE, DETECTION_KM, INCOME_BONUS, INTERCEPT_RATE, INTERCEPTOR_TYPES, JET,
+    MAX_HEALTH, MISSILE, RANGE_KM, START_MISSILES, STRUCTURE_TYPES, STRUCTURE_UNITS,
+)
+
+# ────────────────────────────────────────────────
+# Constants and Unit Tables
+# ────────────────────────────────────────────────
+# Unit stats live in units.json; see ``units`` for the per-type-code lookup arrays
+DEFAULT_ORIGIN = (19.0760, 72.8777)  # Player (HQ) position of a new game
+MAX_BUILD_RADIUS_KM = 50
+COSTS = {name: unit['cost'] for name, unit in STRUCTURE_UNITS.items()}
+STRUCTURE_HEALTH = {name: unit['health'] for name, unit in STRUCTURE_UNITS.items()}
+TICK_INTERVAL = 1.0  # Fixed simulation step (game seconds)
+FAST_FORWARD_STEP = 10.0  # Longest step fast_forward takes (game seconds)
+WAVE_INTERVAL = 30  # Game seconds between enemy waves
+BLAST_RADIUS_KM = MISSILE['blast_radius_km']
+BASE_INCOME = 25
+RESOURCE_MULTIPLIER = 1.0
+
+# Integer type codes index STRUCTURE_TYPES (file order in units.json)
+JET_STATUSES = ["patrolling"]
+PATROLLING = 0
+
+
+def new_structure_store():
+    return EntityStore(
+        {'type': np.int8, 'lat': np.float64, 'lon': np.float64, 'health': np.float64,
+         'missiles': np.int32, 'intercepts': np.int32, 'created_at': np.float64},
+        labels={'type': STRUCTURE_TYPES},
+        tally=('type',),
+    )
+
+
+def new_missile_store():
+    return EntityStore(
+        {'start_lat': np.float64, 'start_lon': np.float64, 'target_lat': np.float64,
+         'target_lon': np.float64, 'launched_at': np.float64, 'progress': np.float64,
+         'speed': np.float64, 'damage': np.float64, 'detected': bool},
+    )
+
+
+def new_aircraft_store():
+    return EntityStore(
+        {'lat': np.float64, 'lon': np.float64, 'target_type': np.int8, 'health': np.float64,
+         'speed_lat': np.float64, 'speed_lon': np.float64, 'detected': bool},
+        labels={'target_type': STRUCTURE_TYPES},
+    )
+
+
+def new_jet_store():
+    return EntityStore(
+        {'lat': np.float64, 'lon': np.float64, 'missiles_left': np.int32, 'status': np.int8,
+         'home_airfield': np.int64, 'fuel': np.float64},
+        labels={'status': JET_STATUSES},
+        tally=('home_airfield',),
+    )
+
+# ────────────────────────────────────────────────
+# Game State
+# ────────────────────────────────────────────────
+def new_seed():
+    """Fresh random game seed; also serves as the game's ID"""
+    return int(np.random.SeedSequence().entropy % 2 ** 63)
+
+
+class GameState:
+    """Everything the simulation mutates. Owned by the simulation thread.
+
+    All randomness comes from ``rng``, seeded from ``seed`` (a fresh one
+    when not given), and player actions go through ``commands.apply`` into
+    ``command_log``, so a game can be replayed exactly from the two.
+    """
+
+    def __init__(self, player_lat=DEFAULT_ORIGIN[0], player_lon=DEFAULT_ORIGIN[1], seed=None):
+        self.seed = new_seed() if seed is None else seed
+        self.rng = np.random.default_rng(self.seed)
+        self.command_log = []  # (tick, command, kwargs)
+        self.player_lat = player_lat
+        self.player_lon = player_lon
+        self.structures = new_structure_store()
+        self.jets = new_jet_store()
+        self.incoming_missiles = new_missile_store()
+        self.enemy_aircraft = new_aircraft_store()
+        self.structure_index = SpatialGrid()
+        self.coverage = CoverageRaster(player_lat, player_lon)  # Radar coverage: the base's plus every radar's
+        self.coverage.add(player_lat, player_lon, BASE['detection_km'])
+        self.events = EventScheduler()
+        self.engagements = {}  # (missile_id, sam_id) -> (enter_at, exit_at)
+        self.resources = 2000
+        self.log = EventLog()
+        self.score = 0
+        self.wave = 1
+        self.resource_nodes = []
+        self.last_wave_spawn = 0.0
+        self.enemy_missiles_intercepted = 0
+        self.structures_destroyed = 0
+        self.game_speed = 1.0
+        self.paused = False
+        self.game_time = 0.0
+        self.tick = 0
+        self.events.schedule(WAVE_INTERVAL, WAVE_SPAWN)
+
+        # Generate initial resource nodes
+        for i in range(5):
+            angle = self.rng.uniform(0, 2 * np.pi)
+            distance = self.rng.uniform(10, 40)
+            lat = self.player_lat + (distance / 111) * np.cos(angle)
+            lon = self.player_lon + (distance / (111 * np.cos(np.radians(self.player_lat)))) * np.sin(angle)
+            self.resource_nodes.append({
+                'lat': lat,
+                'lon': lon,
+                'resources': int(self.rng.integers(200, 501)),
+                'id': i
+            })
+
+
+Snapshot = namedtuple('Snapshot', [
+    'player_lat', 'player_lon', 'structures', 'jets', 'incoming_missiles',
+    'enemy_aircraft', 'resources', 'log', 'score', 'wave', 'resource_nodes',
+    'last_wave_spawn', 'enemy_missiles_intercepted', 'structures_destroyed',
+    'game_speed', 'paused', 'game_time', 'tick',
+])
+
+
+def _freeze(value):
+    if isinstance(value, EntityStore):
+        return value.frozen()
+    if isinstance(value, EventLog):
+        return value.records()
+    if isinstance(value, dict):
+        return MappingProxyType({k: _freeze(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+def take_snapshot(state):
+    """Copy the world into an immutable Snapshot for the render pass"""
+    return Snapshot(**{k: _freeze(getattr(state, k)) for k in Snapshot._fields})
+
+
+# Aggregates over the stores' tallies - O(1), and work on a GameState or a Snapshot
+def income_multiplier(state):
+    tally = state.structures.tallies['type']
+    return 1.0 + float(sum(INCOME_BONUS[code] * n for code, n in tally.items()))
+
+
+def income_rate(state):
+    """Resources per game second"""
+    return BASE_INCOME * income_multiplier(state) / 3.0
+
+
+def defense_count(state):
+    """Structures of the types marked ``defense`` (SAM Sites and Missile Silos)"""
+    return sum(n for code, n in state.structures.tallies['type'].items() if DEFENSE[code])
+
+
+def threat_count(state):
+    """Incoming missiles plus enemy aircraft inside radar coverage; undetected ones stay hidden"""
+    return sum(int(np.count_nonzero(store['detected'] & store.alive))
+               for store in (state.incoming_missiles, state.enemy_aircraft))
+
+
+def log_event(state, kind, *args):
+    """Record a game event (see ``eventlog.EVENT_KINDS``) at the current game time"""
+    state.log.emit(state.game_time, kind, args)
+
+# ────────────────────────────────────────────────
+# Structures and Event Scheduling
+# ────────────────────────────────────────────────
+def build_structure(state, type_name, lat, lon):
+    """Add a structure and index it; returns its ID"""
+    code = state.structures.code('type', type_name)
+    sid = state.structures.spawn(
+        type=code,
+        lat=lat,
+        lon=lon,
+        health=MAX_HEALTH[code],
+        missiles=START_MISSILES[code],
+        intercepts=0,
+        created_at=state.game_time,
+    )
+    state.structure_index.insert(state.structures.slot(sid), code, lat, lon)
+    if DETECTION_KM[code] > 0:
+        state.coverage.add(lat, lon, DETECTION_KM[code])
+    if INTERCEPT_RATE[code] > 0:
+        schedule_sam_site(state, sid)
+    return sid
+
+
+def buildable(player_lat, player_lon, lats, lons):
+    """Which sites may be built on: inside the build radius and on Indian territory (vectorized)"""
+    lats = np.atleast_1d(np.asarray(lats, float))
+    lons = np.atleast_1d(np.asarray(lons, float))
+    in_range = haversine(player_lat, player_lon, lats, lons) <= MAX_BUILD_RADIUS_KM
+    return in_range & territory().contains(lats, lons)
+
+
+def site_error(state, lat, lon):
+    """Why (lat, lon) cannot be built on, or None; ``state`` may be a Snapshot"""
+    if haversine(state.player_lat, state.player_lon, lat, lon) > MAX_BUILD_RADIUS_KM:
+        return f"Outside the construction zone ({MAX_BUILD_RADIUS_KM}km from HQ)"
+    if not territory().contains(lat, lon)[0]:
+        return "Not on Indian territory"
+    return None
+
+
+def remove_structures(state, slots):
+    """Drop structures (demolished or destroyed) from the store, the index and radar coverage"""
+    structures = state.structures
+    for slot in slots:
+        state.structure_index.remove(int(slot))
+        radius = DETECTION_KM[structures['type'][slot]]
+        if radius > 0:
+            state.coverage.remove(structures['lat'][slot], structures['lon'][slot], radius)
+    state.structures.despawn_slots(slots)
+
+
+WAVE_SPAWN = "wave_spawn"
+MISSILE_IMPACT = "missile_impact"
+SAM_ENTER = "sam_enter"
+
+
+def _schedule_sam_windows(state, missile_slots, sam_slots):
+    """Schedule SAM_ENTER events for every missile/SAM pair whose paths cross"""
+    missiles, structures = state.incoming_missiles, state.structures
+    if not len(missile_slots) or not len(sam_slots):
+        return
+    m = np.asarray(missile_slots)[:, None]
+    sams = np.asarray(sam_slots)[None, :]
+    p_in, p_out = zone_windows(
+        missiles['start_lat'][m], missiles['start_lon'][m], missiles['target_lat'][m], missiles['target_lon'][m],
+        structures['lat'][sams], structures['lon'][sams], RANGE_KM[structures['type'][sams]],
+    )
+    launched, speed = missiles['launched_at'][m], missiles['speed'][m]
+    t_in = launched + p_in / speed
+    t_out = launched + p_out / speed
+    for i, j in zip(*np.nonzero(t_out > state.game_time)):
+        state.events.schedule(
+            t_in[i, j], SAM_ENTER, int(missiles.ids[m[i, 0]]), int(structures.ids[sams[0, j]]), t_out[i, j]
+        )
+
+
+def schedule_missile(state, mid):
+    """Predict a new missile's impact and SAM zone entries"""
+    missiles = state.incoming_missiles
+    slot = missiles.slot(mid)
+    state.events.schedule(missiles['launched_at'][slot] + 1.0 / missiles['speed'][slot], MISSILE_IMPACT, mid)
+    sams = [slot for code in INTERCEPTOR_TYPES for slot in state.structure_index.by_type.get(code, ())]
+    _schedule_sam_windows(state, [slot], sams)
+
+
+def schedule_sam_site(state, sid):
+    """Predict when missiles already in flight cross a new SAM Site's zone"""
+    _schedule_sam_windows(state, state.incoming_missiles.active(), [state.structures.slot(sid)])
+
+
+def launch_missile(state, at):
+    """Fire one enemy missile at the base, sized for the current wave; returns its ID"""
+    offset, target_offset = state.rng.uniform((-1.5, -0.3), (1.5, 0.3))
+    mid = state.incoming_missiles.spawn(
+        start_lat=state.player_lat + offset * 3,
+        start_lon=state.player_lon + offset * 3,
+        target_lat=state.player_lat + target_offset,
+        target_lon=state.player_lon + target_offset,
+        launched_at=at,
+        progress=0.0,
+        speed=0.05 + (state.wave * 0.005),
+        damage=20 + (state.wave * 5),
+    )
+    schedule_missile(state, mid)
+    return mid
+
+
+def spawn_bomber(state):
+    """Send one enemy bomber after a random structure type; returns its ID"""
+    d_lat, d_lon, speed_lat, speed_lon = state.rng.uniform((-2, -2, -0.01, -0.01), (2, 2, 0.01, 0.01))
+    return state.enemy_aircraft.spawn(
+        lat=state.player_lat + d_lat,
+        lon=state.player_lon + d_lon,
+        target_type=BOMBER_TARGETS[state.rng.integers(len(BOMBER_TARGETS))],
+        health=BOMBER['health'],
+        speed_lat=speed_lat,
+        speed_lon=speed_lon,
+    )
+
+
+def spawn_wave(state, at):
+    """Launch the next enemy wave at game time ``at`` and schedule the one after"""
+    state.wave += 1
+    state.last_wave_spawn = at
+    state.events.schedule(at + WAVE_INTERVAL, WAVE_SPAWN)
+
+    # Spawn enemy missiles
+    for _ in range(min(state.wave, 5)):
+        launch_missile(state, at)
+
+    # Spawn enemy bombers at higher waves
+    if state.wave >= 3:
+        for _ in range(min(state.wave - 2, 3)):
+            spawn_bomber(state)
+
+    log_event(state, 'wave', state.wave)
+
+# ────────────────────────────────────────────────
+# Game Simulation Step
+# ────────────────────────────────────────────────
+_NO_PROFILE = Profiler("off")  # Stays disabled; stands in when game_tick gets no profiler
+
+
+def game_tick(state, time_delta, prof=None):
+    """Advance the world by time_delta game seconds - updates positions, combat, etc.
+
+    ``prof`` is an optional Profiler that gets a lap per phase.
+    """
+    prof = prof or _NO_PROFILE
+    prof.start()
+    state.tick += 1
+    tick_start = state.game_time
+    state.game_time += time_delta
+    now = state.game_time
+
+    structures = state.structures
+    missiles = state.incoming_missiles
+    aircraft = state.enemy_aircraft
+    jets = state.jets
+    index = state.structure_index
+    s_idx = structures.active()
+    s_type, s_lat, s_lon, s_health = structures['type'], structures['lat'], structures['lon'], structures['health']
+
+    # Generate income
+    state.resources += BASE_INCOME * income_multiplier(state) * time_delta / 3.0
+    prof.lap("income")
+
+    # Release due events - waves, SAM zone entries, impacts
+    impacts = []
+    for at, kind, args in state.events.pop_due(now):
+        if kind == WAVE_SPAWN:
+            spawn_wave(state, at)
+        elif kind == SAM_ENTER:
+            mid, sid, exit_at = args
+            if mid in missiles and sid in structures:
+                state.engagements[(mid, sid)] = (at, exit_at)
+        elif kind == MISSILE_IMPACT:
+            if args[0] in missiles:
+                impacts.append(args[0])
+    prof.lap("events")
+
+    # Update missiles - progress is analytic, so this is only for rendering
+    m_idx = missiles.active()
+    missiles['progress'][m_idx] = missiles['speed'][m_idx] * (now - missiles['launched_at'][m_idx])
+
+    # Check for SAM interception - each engaged SAM rolls for the time the missile
+    # spent in its zone this tick, so missiles that cross a zone between ticks still get a roll
+    engaged = [(mid, sid) for mid, sid in state.engagements if mid in missiles and sid in structures]
+    intercepted = set()
+    if engaged:
+        enter_at, exit_at = np.array([state.engagements[key] for key in engaged]).T
+        exposure = np.clip(np.minimum(exit_at, now) - np.maximum(enter_at, tick_start), 0, None)
+        rate = INTERCEPT_RATE[s_type[[structures.slot(sid) for _, sid in engaged]]]
+        hit = state.rng.random(len(engaged)) < rate * exposure
+        for mid, sid in sorted(key for key, h in zip(engaged, hit) if h):
+            if mid in intercepted:
+                continue
+            intercepted.add(mid)
+            slot = structures.slot(sid)
+            structures['intercepts'][slot] += 1
+            structures.touch([slot])
+            state.enemy_missiles_intercepted += 1
+            state.score += 25
+            log_event(state, 'intercept', STRUCTURE_TYPES[s_type[slot]])
+        state.engagements = {
+            key: window for key, window in zip(engaged, zip(enter_at, exit_at))
+            if window[1] > now and key[0] not in intercepted
+        }
+    else:
+        state.engagements = {}
+    prof.count("engagements", len(engaged))
+    prof.lap("missiles")
+
+    # Check for impact
+    impacts = [mid for mid in impacts if mid not in intercepted]
+    impact_slots = np.array([missiles.slot(mid) for mid in impacts], np.int64)
+    if len(impacts):
+        on_land = territory().contains(missiles['target_lat'][impact_slots], missiles['target_lon'][impact_slots])
+        for landed in on_land:
+            log_event(state, 'impact' if landed else 'splashdown')
+
+    # Damage nearby structures - clamping at zero makes summed damage equal to sequential hits
+    i, hit, dist = index.pairs_within(
+        missiles['target_lat'][impact_slots], missiles['target_lon'][impact_slots], BLAST_RADIUS_KM
+    )
+    damage = (missiles['damage'][impact_slots[i]] * (1 - dist / BLAST_RADIUS_KM)).astype(int)
+    hit, per_hit = np.unique(hit, return_inverse=True)
+    total = np.bincount(per_hit, weights=damage, minlength=len(hit))
+    was_standing = s_health[hit] > 0
+    s_health[hit] = np.maximum(0, s_health[hit] - total)
+    structures.touch(hit)
+    for s in hit[was_standing & (s_health[hit] == 0)]:
+        state.structures_destroyed += 1
+        log_event(state, 'destroyed', STRUCTURE_TYPES[s_type[s]], structures.ids[s])
+
+    # Remove hit/missed missiles
+    missiles.despawn_slots([missiles.slot(mid) for mid in intercepted.union(impacts)])
+    prof.count("impacts", len(impacts))
+    prof.lap("impacts")
+
+    # Update enemy aircraft movement
+    a_lat, a_lon = aircraft['lat'], aircraft['lon']
+    for a in aircraft.active():
+        # Find target
+        target, distance = index.nearest(a_lat[a], a_lon[a], aircraft['target_type'][a])
+        if target is not None:
+            # Move toward target
+            lat_diff = s_lat[target] - a_lat[a]
+            lon_diff = s_lon[target] - a_lon[a]
+            distance = max(0.001, distance)
+            step = min(BOMBER['speed_km_s'] * time_delta / distance, 1.0)  # Long steps stop at the target
+
+            a_lat[a] += lat_diff * step
+            a_lon[a] += lon_diff * step
+
+            # Attack if close enough
+            if distance < BOMBER['attack_range_km']:
+                s_health[target] = max(0, s_health[target] - BOMBER['damage_per_s'] * time_delta)
+                structures.touch([target])
+                log_event(state, 'bomber_attack', STRUCTURE_TYPES[s_type[target]], structures.ids[target])
+                if s_health[target] == 0:
+                    state.structures_destroyed += 1
+    prof.lap("bombers")
+
+    # Radar detection - one raster lookup for every missile and bomber
+    m_idx, a_idx = missiles.active(), aircraft.active()
+    progress = missiles['progress'][m_idx]
+    m_lat = missiles['start_lat'][m_idx] + progress * (missiles['target_lat'][m_idx] - missiles['start_lat'][m_idx])
+    m_lon = missiles['start_lon'][m_idx] + progress * (missiles['target_lon'][m_idx] - missiles['start_lon'][m_idx])
+    detected = state.coverage.covered(np.concatenate([m_lat, a_lat[a_idx]]), np.concatenate([m_lon, a_lon[a_idx]]))
+    missiles['detected'][m_idx] = detected[:len(m_idx)]
+    aircraft['detected'][a_idx] = detected[len(m_idx):]
+    prof.lap("detection")
+
+    # Update jets movement
+    j_idx = jets.active()
+    patrolling = j_idx[jets['status'][j_idx] == PATROLLING]
+    # Move in a patrol pattern
+    jitter = state.rng.uniform(-0.01, 0.01, (2, len(patrolling))) * time_delta
+    jets['lat'][patrolling] += jitter[0]
+    jets['lon'][patrolling] += jitter[1]
+    jets['fuel'][patrolling] -= JET['fuel_burn'] * time_delta
+
+    # Auto-engage enemies in range - each bomber in range gets a roll, jets fire once per tick
+    armed = patrolling[jets['missiles_left'][patrolling] > 0]
+    a_idx = aircraft.active()
+    i, j, _ = pairs_within(jets['lat'][armed], jets['lon'][armed], a_lat[a_idx], a_lon[a_idx], JET['range_km'])
+    hit = state.rng.random(len(i)) < JET['hit_rate'] * time_delta
+    fired = np.zeros(len(armed), bool)
+    shot_down = np.zeros(len(a_idx), bool)
+    for jet, enemy in zip(i[hit], j[hit]):
+        if fired[jet] or shot_down[enemy]:
+            continue
+        fired[jet] = shot_down[enemy] = True
+        jets['missiles_left'][armed[jet]] -= 1
+        state.score += 100
+        log_event(state, 'jet_kill', jets.ids[armed[jet]])
+    aircraft.despawn_slots(a_idx[shot_down])
+
+    out_of_fuel = patrolling[jets['fuel'][patrolling] <= 0]
+    for j in out_of_fuel:
+        log_event(state, 'jet_fuel', jets.ids[j])
+    jets.despawn_slots(out_of_fuel)
+    prof.lap("jets")
+
+    # Remove destroyed structures
+    remove_structures(state, s_idx[s_health[s_idx] <= 0])
+    prof.lap("cleanup")
+    prof.count("structures", len(structures))
+    prof.count("missiles", len(missiles))
+    prof.count("bombers", len(aircraft))
+    prof.count("jets", len(jets))
+    prof.count("events queued", len(state.events))
+    prof.end("tick")
+
+
+def fast_forward(state, seconds, prof=None):
+    """Advance ``seconds`` of game time in a few coarse steps rather than one tick per second.
+
+    Income and missile flight are already analytic, and waves, impacts and
+    SAM engagements fire at their scheduled times whatever the step, so
+    only bombers and jets - which move per step - are approximated.
+    Returns the number of steps taken.
+    """
+    end = state.game_time + seconds
+    steps = 0
+    while end - state.game_time > 1e-9:
+        game_tick(state, min(end - state.game_time, FAST_FORWARD_STEP), prof)
+        steps += 1
+    return steps
@@ -0,0 +1,176 @@
+"""Columnar entity storage"""
+import numpy as np
+
+
+class EntityStore:
+    """Struct-of-arrays entity table.
+
+    Every field is a NumPy column indexed by slot. Freed slots go on a free
+    list, so spawn and despawn are O(1). ``alive`` masks the live rows and
+    ``ids`` holds stable entity IDs that survive slot reuse. Fields listed in
+    ``labels`` are stored as integer codes and decoded by ``row()``.
+    ``version`` goes up whenever the set of live entities changes, and
+    ``revisions`` per row whenever code that edits a row calls ``touch()``.
+    Fields listed in ``tally`` keep live counts per value, updated on spawn
+    and despawn, so ``count()`` is O(1); tallied fields must not be edited
+    after spawn.
+    """
+
+    def __init__(self, fields, labels=None, capacity=16, tally=()):
+        self.fields = dict(fields)
+        self.labels = labels or {}
+        self.tallies = {name: {} for name in tally}
+        self._codes = {f: {name: i for i, name in enumerate(names)} for f, names in self.labels.items()}
+        self.columns = {name: np.zeros(0, dtype) for name, dtype in self.fields.items()}
+        self.ids = np.zeros(0, np.int64)
+        self.revisions = np.zeros(0, np.int64)
+        self.alive = np.zeros(0, bool)
+        self.capacity = 0
+        self.next_id = 1
+        self.version = 0
+        self.readonly = False
+        self._free = []
+        self._slots = {}
+        self._grow(capacity)
+
+    def _grow(self, capacity):
+        old = self.capacity
+        for name, col in self.columns.items():
+            self.columns[name] = np.concatenate([col, np.zeros(capacity - old, col.dtype)])
+        self.ids = np.concatenate([self.ids, np.zeros(capacity - old, np.int64)])
+        self.revisions = np.concatenate([self.revisions, np.zeros(capacity - old, np.int64)])
+        self.alive = np.concatenate([self.alive, np.zeros(capacity - old, bool)])
+        self._free.extend(range(capacity - 1, old - 1, -1))
+        self.capacity = capacity
+
+    def __len__(self):
+        return len(self._slots)
+
+    def __contains__(self, eid):
+        return eid in self._slots
+
+    def __getitem__(self, field):
+        return self.columns[field]
+
+    def code(self, field, label):
+        return self._codes[field][label]
+
+    def spawn(self, **values):
+        """Add an entity and return its ID"""
+        if self.readonly:
+            raise TypeError("cannot spawn into a read-only EntityStore")
+        unknown = values.keys() - self.columns.keys()
+        if unknown:
+            raise KeyError(f"unknown fields: {sorted(unknown)}")
+        if not self._free:
+            self._grow(self.capacity * 2)
+        slot = self._free.pop()
+        for name, col in self.columns.items():
+            value = values.get(name, 0)
+            if isinstance(value, str):
+                value = self._codes[name][value]
+            col[slot] = value
+        eid = self.next_id
+        self.next_id += 1
+        self.version += 1
+        for name, counts in self.tallies.items():
+            value = self.columns[name][slot].item()
+            counts[value] = counts.get(value, 0) + 1
+        self.ids[slot] = eid
+        self.revisions[slot] = 0
+        self.alive[slot] = True
+        self._slots[eid] = slot
+        return eid
+
+    def despawn(self, eid):
+        self.despawn_slots([self._slots[eid]])
+
+    def despawn_slots(self, slots):
+        if self.readonly:
+            raise TypeError("cannot despawn from a read-only EntityStore")
+        if not len(slots):
+            return  # Leave version alone so caches keyed on it stay valid
+        for slot in slots:
+            del self._slots[int(self.ids[slot])]
+            self._free.append(int(slot))
+            for name, counts in self.tallies.items():
+                value = self.columns[name][slot].item()
+                counts[value] -= 1
+                if not counts[value]:
+                    del counts[value]
+        self.alive[slots] = False
+        self.version += 1
+
+    def touch(self, slots):
+        """Mark rows as edited so render caches rebuild them"""
+        np.add.at(self.revisions, slots, 1)
+
+    def count(self, field, value):
+        """Live entities whose tallied ``field`` equals ``value`` (a label or a raw value)"""
+        if isinstance(value, str):
+            value = self._codes[field][value]
+        return self.tallies[field].get(value, 0)
+
+    def slot(self, eid):
+        """Slot holding entity ``eid``, or None if it is gone"""
+        return self._slots.get(eid)
+
+    def active(self):
+        """Slots of live entities, in slot order"""
+        return np.flatnonzero(self.alive)
+
+    def row_at(self, slot):
+        row = {'id': int(self.ids[slot])}
+        for name, col in self.columns.items():
+            value = col[slot].item()
+            row[name] = self.labels[name][value] if name in self.labels else value
+        return row
+
+    def row(self, eid):
+        """Entity ``eid`` as a plain dict, or None if it is gone"""
+        slot = self._slots.get(eid)
+        return None if slot is None else self.row_at(slot)
+
+    def rows(self):
+        return [self.row_at(slot) for slot in self.active()]
+
+    def dump(self):
+        """Columns and bookkeeping as a flat {name: array} dict, for save files"""
+        arrays = {f'col.{name}': col for name, col in self.columns.items()}
+        arrays.update(
+            ids=self.ids, revisions=self.revisions, alive=self.alive,
+            free=np.array(self._free, np.int64), counters=np.array([self.next_id, self.version], np.int64),
+        )
+        return arrays
+
+    def load(self, arrays):
+        """Replace the contents with a ``dump()``; the arrays are used as given, so they may be memory-mapped"""
+        self.columns = {name: arrays[f'col.{name}'] for name in self.fields}
+        self.ids, self.revisions, self.alive = arrays['ids'], arrays['revisions'], arrays['alive']
+        self.capacity = len(self.ids)
+        self._free = arrays['free'].tolist()
+        self.next_id, self.version = (int(v) for v in arrays['counters'])
+        self._slots = {int(self.ids[slot]): int(slot) for slot in self.active()}
+        for name in self.tallies:
+            values, counts = np.unique(self.columns[name][self.active()], return_counts=True)
+            self.tallies[name] = dict(zip(values.tolist(), counts.tolist()))
+
+    def frozen(self):
+        """Read-only copy for snapshots"""
+        copy = object.__new__(EntityStore)
+        copy.__dict__.update(self.__dict__)
+        copy.columns = {name: _readonly(col) for name, col in self.columns.items()}
+        copy.ids = _readonly(self.ids)
+        copy.revisions = _readonly(self.revisions)
+        copy.alive = _readonly(self.alive)
+        copy._free = []
+        copy._slots = dict(self._slots)
+        copy.tallies = {name: dict(counts) for name, counts in self.tallies.items()}
+        copy.readonly = True
+        return copy
+
+
+def _readonly(array):
+    array = array.copy()
+    array.flags.writeable = False
+    return array
@@ -0,0 +1,138 @@
+"""Monte Carlo evaluation of defense layouts.
+
+A layout is a list of ``(type_name, lat, lon)``. ``evaluate`` builds it
+around the player position in many seeded headless games, runs each for a
+number of waves and reports survival, intercept rate and resource curves.
+``suggest`` tries a structure at candidate sites inside
+``MAX_BUILD_RADIUS_KM`` and ranks them. All candidates see the same seeds,
+so they face identical waves and the comparison has less noise.
+
+Runs are spread over a ProcessPoolExecutor. Workers get nothing but seeds
+and layouts and send back plain arrays. Streamlit's ``__main__`` cannot be
+re-imported by pool workers, so the app goes through ``run_cli``, which
+calls ``python -m yuddhasphere`` in a fresh interpreter.
+"""
+import json
+import math
+import os
+import subprocess
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from .engine import (
+    DEFAULT_ORIGIN, MAX_BUILD_RADIUS_KM, TICK_INTERVAL, WAVE_INTERVAL, GameState, build_structure, buildable, game_tick,
+)
+from .geo import EARTH_RADIUS_KM
+
+BATCHES_PER_WORKER = 4  # Batches per worker; more batches balance load better, fewer ship less
+
+
+def _run_batch(layout, seeds, waves, origin):
+    """Play ``waves`` waves per seed; returns per-run (survival, intercepted, resolved, destroyed, resources)"""
+    out = np.zeros((len(seeds), 4))
+    resources = np.zeros((len(seeds), waves))
+    ticks_per_wave = round(WAVE_INTERVAL / TICK_INTERVAL)
+    for r, seed in enumerate(seeds):
+        state = GameState(*origin, seed=int(seed))
+        for type_name, lat, lon in layout:
+            build_structure(state, type_name, lat, lon)
+        built = len(state.structures)
+        # Wave w spawns at tick w * ticks_per_wave; sample just before the next one
+        for w in range(waves):
+            while state.tick < (w + 2) * ticks_per_wave - 1:
+                game_tick(state, TICK_INTERVAL)
+            resources[r, w] = state.resources
+        resolved = state.incoming_missiles.next_id - 1 - len(state.incoming_missiles)
+        out[r] = (len(state.structures) / built if built else 1.0, state.enemy_missiles_intercepted,
+                  resolved, state.structures_destroyed)
+    return out, resources
+
+
+def _seeds(seed, runs):
+    return [int(s) for s in np.random.SeedSequence(seed).generate_state(runs, np.uint64) % 2 ** 63]
+
+
+def _batches(seeds, workers):
+    n = max(1, min(len(seeds), workers * BATCHES_PER_WORKER))
+    return [list(chunk) for chunk in np.array_split(seeds, n) if len(chunk)]
+
+
+def _summary(layout, waves, out, resources):
+    survival, intercepted, resolved, destroyed = out.T
+    return {
+        'layout': [list(entry) for entry in layout],
+        'runs': len(out),
+        'waves': waves,
+        'survival_rate': float(survival.mean()),
+        'flawless_rate': float(np.mean(survival == 1)),
+        'intercept_rate': float(intercepted.sum() / max(resolved.sum(), 1)),
+        'structures_lost': float(destroyed.mean()),
+        'resources': {
+            'mean': resources.mean(axis=0).round(1).tolist(),
+            'p10': np.percentile(resources, 10, axis=0).round(1).tolist(),
+            'p90': np.percentile(resources, 90, axis=0).round(1).tolist(),
+        },
+    }
+
+
+def _evaluate_many(layouts, runs, waves, seed, workers, origin):
+    """Summaries for several layouts over the same seeds, on one pool"""
+    workers = workers or os.cpu_count() or 1
+    seeds = _seeds(seed, runs)
+    batches = _batches(seeds, workers)
+    jobs = [(layout, batch, waves, origin) for layout in layouts for batch in batches]
+    if workers == 1:
+        results = [_run_batch(*job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_run_batch, *zip(*jobs)))
+    summaries = []
+    for k, layout in enumerate(layouts):
+        parts = results[k * len(batches):(k + 1) * len(batches)]
+        summaries.append(_summary(
+            layout, waves, np.concatenate([p[0] for p in parts]), np.concatenate([p[1] for p in parts]),
+        ))
+    return summaries
+
+
+def evaluate(layout, runs=1000, waves=10, seed=0, workers=None, origin=DEFAULT_ORIGIN):
+    """Survival, intercept rate and resource curves for ``layout`` over ``runs`` seeded games"""
+    return _evaluate_many([list(layout)], runs, waves, seed, workers, origin)[0]
+
+
+def candidate_sites(origin=DEFAULT_ORIGIN, radius_km=MAX_BUILD_RADIUS_KM, rings=4, per_ring=8):
+    """The base itself plus ``rings`` rings of ``per_ring`` sites out to ``radius_km``, minus unbuildable ones"""
+    lat0, lon0 = origin
+    sites = [(lat0, lon0)]
+    for ring in range(1, rings + 1):
+        r = math.degrees(radius_km * 0.99 * ring / rings / EARTH_RADIUS_KM)  # Just inside the build radius
+        for k in range(per_ring):
+            angle = 2 * math.pi * (k + 0.5 * (ring % 2)) / per_ring
+            sites.append((lat0 + r * math.cos(angle), lon0 + r / math.cos(math.radians(lat0)) * math.sin(angle)))
+    lats, lons = np.array(sites).T
+    return [site for site, ok in zip(sites, buildable(lat0, lon0, lats, lons)) if ok]
+
+
+def suggest(layout, type_name, runs=200, waves=10, seed=0, workers=None, origin=DEFAULT_ORIGIN,
+            top=5, sites=None):
+    """Rank candidate sites for one more ``type_name``; returns the ``top`` summaries, best first"""
+    sites = candidate_sites(origin) if sites is None else sites
+    layouts = [list(layout) + [(type_name, lat, lon)] for lat, lon in sites]
+    summaries = _evaluate_many(layouts, runs, waves, seed, workers, origin)
+    for summary, (lat, lon) in zip(summaries, sites):
+        summary['site'] = [lat, lon]
+    summaries.sort(key=lambda s: (s['survival_rate'], s['intercept_rate'], s['resources']['mean'][-1]), reverse=True)
+    return summaries[:top]
+
+
+def run_cli(command, layout, **options):
+    """Run ``evaluate`` or ``suggest`` through ``python -m yuddhasphere`` and return its JSON result"""
+    args = [sys.executable, "-m", "yuddhasphere", command, "--layout", "-", "--json"]
+    for name, value in options.items():
+        args += [f"--{name.replace('_', '-')}", str(value)]
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    result = subprocess.run(args, input=json.dumps([list(entry) for entry in layout]), capture_output=True,
+                            text=True, cwd=root, check=True)
+    return json.loads(result.stdout)
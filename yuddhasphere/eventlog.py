@@ -0,0 +1,140 @@
+"""Structured game log: typed events in a ring buffer, formatted on demand.
+
+The engine records ``(kind, args)`` pairs, never strings. ``format_event``
+turns one into a log line only when something displays it. A repeat of
+the same kind and args within ``COALESCE_SECONDS`` of game time bumps the
+earlier entry's count instead of taking a new slot. A ``JsonlSink``, when
+attached, gets every event (coalesced or not) and appends them to a
+JSON-lines file in batches, for analysis after the match.
+"""
+import json
+from collections import namedtuple
+
+import numpy as np
+
+LOG_CAPACITY = 64  # Events kept in the ring
+COALESCE_SECONDS = 5.0  # Game seconds within which a repeat folds into the earlier entry
+SINK_BATCH = 256  # Events a JsonlSink buffers before appending them to its file
+
+LEVEL_ICONS = {
+    "info": "📘",
+    "warning": "⚠️",
+    "danger": "🚨",
+    "success": "✅",
+    "resource": "💰",
+}
+
+# kind -> (level, template filled from the event's args)
+EVENT_KINDS = {
+    'built': ("success", "Built {} #{}"),
+    'demolished': ("warning", "Demolished {} #{}"),
+    'repaired': ("success", "Repaired {} #{}"),
+    'jet_deployed': ("success", "Jet deployed from {} #{}"),
+    'missile_launched': ("warning", "Missile launched from {} #{}"),
+    'skipped': ("info", "Skipped {:.0f}s to wave {}"),
+    'save_discarded': ("warning", "Could not resume the saved game ({}); started a new one"),
+    'wave': ("danger", "Wave {} incoming!"),
+    'intercept': ("success", "{} intercepted enemy missile!"),
+    'impact': ("danger", "💥 Enemy missile impact!"),
+    'splashdown': ("info", "🌊 Enemy missile came down outside our territory"),
+    'destroyed': ("danger", "{} #{} destroyed!"),
+    'bomber_attack': ("warning", "Enemy bomber attacking {} #{}!"),
+    'jet_kill': ("success", "Jet #{} shot down enemy bomber!"),
+    'jet_fuel': ("warning", "Jet #{} ran out of fuel"),
+}
+
+# ``time`` is when it first happened, ``last`` the latest repeat
+LogEvent = namedtuple('LogEvent', 'time kind args count last')
+
+
+def format_event(event):
+    """The log line for an event, e.g. '✅ [T+01:05] Built SAM Site #3 (×2)'"""
+    level, template = EVENT_KINDS[event.kind]
+    minutes, seconds = divmod(int(event.time), 60)
+    line = f"{LEVEL_ICONS.get(level, '📝')} [T+{minutes:02d}:{seconds:02d}] {template.format(*event.args)}"
+    return line if event.count == 1 else f"{line} (×{event.count})"
+
+
+class EventLog:
+    """Fixed-size ring of LogEvents; the oldest entries are overwritten"""
+
+    def __init__(self, capacity=LOG_CAPACITY, sink=None):
+        self.capacity = capacity
+        self.sink = sink
+        self.seq = 0  # Entries ever written; the newest is in slot (seq - 1) % capacity
+        self._ring = [None] * capacity
+        self._recent = {}  # (kind, args) -> seq of its entry, for coalescing
+
+    def __len__(self):
+        return min(self.seq, self.capacity)
+
+    def __iter__(self):
+        return iter(self.records())
+
+    def emit(self, time, kind, args=()):
+        if kind not in EVENT_KINDS:
+            raise KeyError(f"unknown log event kind {kind!r}")
+        args = tuple(a.item() if isinstance(a, np.generic) else a for a in args)
+        if self.sink is not None:
+            self.sink.write(time, kind, args)
+        key = (kind, args)
+        seq = self._recent.get(key)
+        if seq is not None and seq > self.seq - self.capacity:
+            slot = seq % self.capacity
+            entry = self._ring[slot]
+            if time - entry.last <= COALESCE_SECONDS:
+                self._ring[slot] = entry._replace(count=entry.count + 1, last=time)
+                return
+        slot = self.seq % self.capacity
+        old = self._ring[slot]
+        if old is not None and self._recent.get((old.kind, old.args)) == self.seq - self.capacity:
+            del self._recent[(old.kind, old.args)]
+        self._ring[slot] = LogEvent(time, kind, args, 1, time)
+        self._recent[key] = self.seq
+        self.seq += 1
+
+    def records(self):
+        """The kept events, oldest first, as a tuple (safe to hand to readers)"""
+        if self.seq <= self.capacity:
+            return tuple(self._ring[:self.seq])
+        start = self.seq % self.capacity
+        return tuple(self._ring[start:] + self._ring[:start])
+
+    def dump(self):
+        """Kept events as JSON-friendly lists, for save files"""
+        return [list(event) for event in self.records()]
+
+    def load(self, entries):
+        self._ring = [None] * self.capacity
+        self._recent = {}
+        self.seq = 0
+        for time, kind, args, count, last in entries[-self.capacity:]:
+            self._ring[self.seq] = LogEvent(time, kind, tuple(args), count, last)
+            self._recent[(kind, tuple(args))] = self.seq
+            self.seq += 1
+
+
+class JsonlSink:
+    """Appends events to a JSON-lines file, ``batch`` at a time; ``flush`` writes the rest"""
+
+    def __init__(self, path, batch=SINK_BATCH):
+        self.path = path
+        self.batch = batch
+        self._pending = []
+
+    def write(self, time, kind, args):
+        self._pending.append((time, kind, args))
+        if len(self._pending) >= self.batch:
+            self.flush()
+
+    def flush(self):
+        if not self._pending:
+            return
+        lines = []
+        for time, kind, args in self._pending:
+            level, template = EVENT_KINDS[kind]
+            lines.append(json.dumps({'t': time, 'kind': kind, 'level': level, 'args': args,
+                                     'text': template.format(*args)}) + "\n")
+        with open(self.path, "a") as f:
+            f.writelines(lines)
+        self._pending = []
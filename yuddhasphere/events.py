@@ -0,0 +1,36 @@
+"""Time-ordered game event queue"""
+import heapq
+
+
+class EventScheduler:
+    """Min-heap of future game events, released in time order once due.
+
+    Events name entities by ID and are not cancelled when an entity goes
+    away; handlers check that their entities still exist.
+    """
+
+    def __init__(self):
+        self._heap = []
+        self._seq = 0
+
+    def __len__(self):
+        return len(self._heap)
+
+    def schedule(self, at, kind, *args):
+        heapq.heappush(self._heap, (at, self._seq, kind, args))
+        self._seq += 1
+
+    def pop_due(self, now):
+        """Yield (time, kind, args) for every event due by ``now``, including ones scheduled while iterating"""
+        while self._heap and self._heap[0][0] <= now:
+            at, _, kind, args = heapq.heappop(self._heap)
+            yield at, kind, args
+
+    def dump(self):
+        """Pending events and the tie-break counter, for save files"""
+        return list(self._heap), self._seq
+
+    def load(self, entries, seq):
+        self._heap = [(at, seq, kind, tuple(args)) for at, seq, kind, args in entries]
+        heapq.heapify(self._heap)
+        self._seq = seq
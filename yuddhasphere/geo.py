@@ -0,0 +1,226 @@
+"""Geographic distance kernels, the structure spatial index and the radar coverage raster"""
+import math
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    """Calculate distance between two points in km"""
+    R = EARTH_RADIUS_KM
+    dlat = np.radians(lat2 - lat1)
+    dlon = np.radians(lon2 - lon1)
+    a = np.sin(dlat/2)**2 + np.cos(np.radians(lat1)) * np.cos(np.radians(lat2)) * np.sin(dlon/2)**2
+    c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+    return R * c
+
+
+def pairs_within(lat1, lon1, lat2, lon2, radius_km):
+    """Find every (i, j) with point i of set 1 within radius_km of point j of set 2.
+
+    Set 2 is sorted by latitude once and each point of set 1 only looks at
+    the latitude band that can reach it, so haversine runs on candidate
+    pairs rather than the full N x M grid. Returns (i, j, dist_km) ordered
+    by i, then j.
+    """
+    lat1, lon1 = np.asarray(lat1, float), np.asarray(lon1, float)
+    lat2, lon2 = np.asarray(lat2, float), np.asarray(lon2, float)
+    order = np.argsort(lat2, kind='stable')
+    band = np.degrees(radius_km / EARTH_RADIUS_KM)
+    lo = np.searchsorted(lat2[order], lat1 - band, 'left')
+    hi = np.searchsorted(lat2[order], lat1 + band, 'right')
+    counts = hi - lo
+    i = np.repeat(np.arange(len(lat1)), counts)
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    j = order[np.repeat(lo, counts) + offsets]
+    dist = haversine(lat1[i], lon1[i], lat2[j], lon2[j])
+    keep = dist < radius_km
+    i, j, dist = i[keep], j[keep], dist[keep]
+    ordered = np.lexsort((j, i))
+    return i[ordered], j[ordered], dist[ordered]
+
+
+class SpatialGrid:
+    """Bucket grid over fixed points, split by type code.
+
+    Points sit in cell_deg x cell_deg lat/lon cells, so range and nearest
+    queries only visit cells the search can reach. Insert and remove are
+    O(1), which keeps the index current as structures are built,
+    demolished and destroyed.
+    """
+
+    def __init__(self, cell_deg=0.2):
+        self.cell_deg = cell_deg
+        self.cells = {}    # (type_code, cy, cx) -> {key: (lat, lon)}
+        self.by_type = {}  # type_code -> {key: (lat, lon)}
+        self.extent = {}   # type_code -> [min_cy, max_cy, min_cx, max_cx], grows only
+        self._where = {}   # key -> cell
+
+    def __len__(self):
+        return len(self._where)
+
+    def _cell(self, lat, lon):
+        return math.floor(lat / self.cell_deg), math.floor(lon / self.cell_deg)
+
+    def _reach(self, lat, radius_km):
+        dlat = math.degrees(radius_km / EARTH_RADIUS_KM)
+        dlon = dlat / max(math.cos(math.radians(lat)), 0.01)
+        return math.ceil(dlat / self.cell_deg), math.ceil(dlon / self.cell_deg)
+
+    def insert(self, key, type_code, lat, lon):
+        type_code = int(type_code)
+        cy, cx = self._cell(lat, lon)
+        cell = (type_code, cy, cx)
+        self.cells.setdefault(cell, {})[key] = (lat, lon)
+        self.by_type.setdefault(type_code, {})[key] = (lat, lon)
+        self._where[key] = cell
+        bounds = self.extent.setdefault(type_code, [cy, cy, cx, cx])
+        bounds[:] = [min(bounds[0], cy), max(bounds[1], cy), min(bounds[2], cx), max(bounds[3], cx)]
+
+    def remove(self, key):
+        cell = self._where.pop(key)
+        del self.cells[cell][key]
+        if not self.cells[cell]:
+            del self.cells[cell]
+        del self.by_type[cell[0]][key]
+
+    def pairs_within(self, lats, lons, radius_km, type_code=None):
+        """Batched range query: (i, key, dist_km) for every query point i, ordered by i then key"""
+        types = list(self.by_type) if type_code is None else [int(type_code)]
+        qi, keys, plats, plons = [], [], [], []
+        for i, (lat, lon) in enumerate(zip(lats, lons)):
+            cy, cx = self._cell(lat, lon)
+            ry, rx = self._reach(lat, radius_km)
+            for t in types:
+                for y in range(cy - ry, cy + ry + 1):
+                    for x in range(cx - rx, cx + rx + 1):
+                        cell = self.cells.get((t, y, x))
+                        if cell:
+                            qi.extend([i] * len(cell))
+                            keys.extend(cell)
+                            for plat, plon in cell.values():
+                                plats.append(plat)
+                                plons.append(plon)
+        qi, keys = np.array(qi, np.int64), np.array(keys, np.int64)
+        dist = haversine(np.asarray(lats, float)[qi], np.asarray(lons, float)[qi], np.array(plats), np.array(plons))
+        keep = dist < radius_km
+        qi, keys, dist = qi[keep], keys[keep], dist[keep]
+        ordered = np.lexsort((keys, qi))
+        return qi[ordered], keys[ordered], dist[ordered]
+
+    def within(self, lat, lon, radius_km, type_code=None):
+        """Keys within radius_km of (lat, lon) and their distances"""
+        _, keys, dist = self.pairs_within([lat], [lon], radius_km, type_code)
+        return keys, dist
+
+    def nearest(self, lat, lon, type_code):
+        """Closest key of the given type and its distance, or (None, inf)"""
+        type_code = int(type_code)
+        points = self.by_type.get(type_code)
+        if not points:
+            return None, math.inf
+        cy, cx = self._cell(lat, lon)
+        min_cy, max_cy, min_cx, max_cx = self.extent[type_code]
+        max_ring = max(cy - min_cy, max_cy - cy, cx - min_cx, max_cx - cx)
+
+        # Few points spread far apart - scanning them beats walking empty rings
+        if (2 * max_ring + 1) ** 2 > 4 * len(points):
+            keys = list(points)
+            coords = np.array(list(points.values()))
+            dist = haversine(lat, lon, coords[:, 0], coords[:, 1])
+            k = int(np.argmin(dist))
+            return keys[k], float(dist[k])
+
+        ring_km = math.radians(self.cell_deg) * EARTH_RADIUS_KM * max(math.cos(math.radians(abs(lat) + self.cell_deg * max_ring)), 0.01)
+        best, best_dist = None, math.inf
+        for r in range(max_ring + 1):
+            if (r - 1) * ring_km > best_dist:
+                break
+            keys, coords = [], []
+            for y in range(cy - r, cy + r + 1):
+                step = 1 if y in (cy - r, cy + r) else 2 * r or 1
+                for x in range(cx - r, cx + r + 1, step):
+                    cell = self.cells.get((type_code, y, x))
+                    if cell:
+                        keys.extend(cell)
+                        coords.extend(cell.values())
+            if keys:
+                coords = np.array(coords)
+                dist = haversine(lat, lon, coords[:, 0], coords[:, 1])
+                k = int(np.argmin(dist))
+                if dist[k] < best_dist:
+                    best, best_dist = keys[k], float(dist[k])
+        return best, best_dist
+
+
+def zone_windows(start_lat, start_lon, target_lat, target_lon, center_lat, center_lon, radius_km):
+    """Progress interval [p_in, p_out] a straight lat/lon path spends inside a circle.
+
+    Solves |start + p * (target - start) - center| = radius in a local
+    equirectangular frame around the center. Arguments broadcast; paths that
+    miss the circle (or only touch it outside 0 <= p <= 1) get NaN.
+    """
+    ky = math.radians(1) * EARTH_RADIUS_KM
+    kx = ky * np.cos(np.radians(center_lat))
+    x0, y0 = (start_lon - center_lon) * kx, (start_lat - center_lat) * ky
+    dx, dy = (target_lon - start_lon) * kx, (target_lat - start_lat) * ky
+    a = np.maximum(dx * dx + dy * dy, 1e-12)
+    b = 2 * (x0 * dx + y0 * dy)
+    c = x0 * x0 + y0 * y0 - radius_km * radius_km
+    disc = b * b - 4 * a * c
+    root = np.sqrt(np.maximum(disc, 0))
+    p_in = np.maximum((-b - root) / (2 * a), 0.0)
+    p_out = np.minimum((-b + root) / (2 * a), 1.0)
+    miss = (disc <= 0) | (p_in >= p_out)
+    return np.where(miss, np.nan, p_in), np.where(miss, np.nan, p_out)
+
+
+class CoverageRaster:
+    """Detection coverage on a lat/lon grid around a fixed center.
+
+    Each cell counts the detection circles covering it. ``add`` and
+    ``remove`` paint one circle (cost: the cells in its bounding box), so
+    the raster only changes when radars come and go. ``covered`` answers
+    for any number of points with one array lookup. Points off the raster
+    are never covered.
+    """
+
+    def __init__(self, center_lat, center_lon, span_deg=5.0, cell_deg=0.05):
+        self.cell_deg = cell_deg
+        self.south = center_lat - span_deg
+        self.west = center_lon - span_deg
+        size = int(round(2 * span_deg / cell_deg))
+        self.counts = np.zeros((size, size), np.int16)
+        self.version = 0
+
+    def _paint(self, lat, lon, radius_km, delta):
+        rows, cols = self.counts.shape
+        dlat = math.degrees(radius_km / EARTH_RADIUS_KM)
+        dlon = dlat / max(math.cos(math.radians(lat)), 0.01)
+        r0 = max(math.floor((lat - dlat - self.south) / self.cell_deg), 0)
+        r1 = min(math.ceil((lat + dlat - self.south) / self.cell_deg), rows)
+        c0 = max(math.floor((lon - dlon - self.west) / self.cell_deg), 0)
+        c1 = min(math.ceil((lon + dlon - self.west) / self.cell_deg), cols)
+        if r0 >= r1 or c0 >= c1:
+            return
+        cell_lat = self.south + (np.arange(r0, r1) + 0.5) * self.cell_deg
+        cell_lon = self.west + (np.arange(c0, c1) + 0.5) * self.cell_deg
+        inside = haversine(cell_lat[:, None], cell_lon[None, :], lat, lon) <= radius_km
+        self.counts[r0:r1, c0:c1] += inside * np.int16(delta)
+        self.version += 1
+
+    def add(self, lat, lon, radius_km):
+        self._paint(lat, lon, radius_km, 1)
+
+    def remove(self, lat, lon, radius_km):
+        self._paint(lat, lon, radius_km, -1)
+
+    def covered(self, lats, lons):
+        """Whether each point lies in at least one detection circle"""
+        rows = np.floor((np.asarray(lats, float) - self.south) / self.cell_deg).astype(np.int64)
+        cols = np.floor((np.asarray(lons, float) - self.west) / self.cell_deg).astype(np.int64)
+        on = (rows >= 0) & (rows < self.counts.shape[0]) & (cols >= 0) & (cols < self.counts.shape[1])
+        out = np.zeros(len(rows), bool)
+        out[on] = self.counts[rows[on], cols[on]] > 0
+        return out
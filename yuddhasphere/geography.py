@@ -0,0 +1,89 @@
+"""Real geography: India's territory, loaded once per process.
+
+``india.geojson`` is the Natural Earth 1:110m outline (public domain), so
+coastlines are accurate to roughly ten kilometres. ``territory()`` parses it
+on first use and keeps the result for the life of the process; Streamlit
+sessions, match servers and evaluation workers each load it once.
+
+With shapely installed, the polygon parts are prepared and put in an
+STRtree. A batch of points asks the tree for the parts that touch its
+bounding box and tests them with ``contains_xy``. Without shapely,
+``contains`` falls back to even-odd ray casting in NumPy. Either way a
+batch costs a few vectorized calls, not one per point.
+"""
+import json
+import os
+import threading
+
+import numpy as np
+
+try:
+    import shapely
+except ImportError:  # Optional - only makes big batches faster
+    shapely = None
+
+GEOGRAPHY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "india.geojson")
+
+
+def _polygons(geometry):
+    if geometry['type'] == 'Polygon':
+        return [geometry['coordinates']]
+    if geometry['type'] == 'MultiPolygon':
+        return geometry['coordinates']
+    raise ValueError(f"unsupported geometry type {geometry['type']!r}")
+
+
+class Territory:
+    """Point-in-polygon tests against the polygons of a GeoJSON file"""
+
+    def __init__(self, path=GEOGRAPHY_PATH):
+        with open(path, encoding="utf-8") as f:
+            collection = json.load(f)
+        polygons = [poly for feature in collection['features'] for poly in _polygons(feature['geometry'])]
+        self.rings = [np.array(ring, float) for poly in polygons for ring in poly]  # (lon, lat) vertices
+        self.bounds = (min(r[:, 1].min() for r in self.rings), min(r[:, 0].min() for r in self.rings),
+                       max(r[:, 1].max() for r in self.rings), max(r[:, 0].max() for r in self.rings))
+        self._parts = self._tree = None
+        if shapely is not None:
+            self._parts = [shapely.Polygon(poly[0], poly[1:]) for poly in polygons]
+            shapely.prepare(self._parts)
+            self._tree = shapely.STRtree(self._parts)
+
+    def contains(self, lats, lons):
+        """Whether each point lies inside the territory"""
+        lats = np.atleast_1d(np.asarray(lats, float))
+        lons = np.atleast_1d(np.asarray(lons, float))
+        south, west, north, east = self.bounds
+        inside = np.zeros(len(lats), bool)
+        near = np.flatnonzero((lats >= south) & (lats <= north) & (lons >= west) & (lons <= east))
+        if not len(near):
+            return inside
+        x, y = lons[near], lats[near]
+        if self._tree is not None:
+            for k in self._tree.query(shapely.box(x.min(), y.min(), x.max(), y.max())):
+                inside[near] |= shapely.contains_xy(self._parts[k], x, y)
+            return inside
+        x, y = x[:, None], y[:, None]
+        crossings = np.zeros(len(near), np.int64)
+        for ring in self.rings:
+            x0, y0 = ring[:, 0], ring[:, 1]
+            x1, y1 = np.roll(x0, -1), np.roll(y0, -1)
+            straddles = (y0 > y) != (y1 > y)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                cross_x = x0 + (y - y0) * (x1 - x0) / (y1 - y0)
+            crossings += np.count_nonzero(straddles & (x < cross_x), axis=1)
+        inside[near] = crossings % 2 == 1
+        return inside
+
+
+_territory = None
+_lock = threading.Lock()
+
+
+def territory():
+    """The process-wide Territory for ``GEOGRAPHY_PATH``, loaded on first use"""
+    global _territory
+    with _lock:
+        if _territory is None:
+            _territory = Territory()
+        return _territory
@@ -0,0 +1,176 @@
+"""Multi-session load test: many headless app sessions through Streamlit's testing API.
+
+For each session count, ``run_load`` opens that many ``AppTest`` sessions of
+``app.py`` and plays one script in each, round-robin. The script alternates
+``builds`` build rounds with ``waves`` skip-to-next-wave rounds, which
+also pay for the builds. It then reruns idle until ``rounds`` rounds have
+passed. Each session plays its own match unless
+``shared`` puts them all in one. The result for each count holds:
+
+- per-session memory, from ``session_footprint``
+- rerun latency percentiles
+- CPU used by this process, as a percentage of one core
+
+Matches run as threads here by default, so that CPU includes the
+simulations. With ``processes`` it covers the sessions only. Compare
+compact sessions or a memory cap against the default::
+
+    python -m yuddhasphere loadtest --sessions 1 --sessions 8 --sessions 32
+    python -m yuddhasphere loadtest --sessions 32 --compact
+"""
+import json
+import os
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+from .evaluate import candidate_sites
+from .profiling import session_footprint
+from .units import STRUCTURE_TYPES
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+SESSION_COUNTS = (1, 4, 16)
+RERUN_TIMEOUT = 60.0  # Seconds before AppTest gives up on one rerun
+
+
+@contextmanager
+def _environment(**values):
+    """Set app config env vars for the duration; the app re-reads them on every rerun"""
+    old = {name: os.environ.get(name) for name in values}
+    os.environ.update(values)
+    try:
+        yield
+    finally:
+        for name, value in old.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+
+def _button(elements, label):
+    return next(b for b in elements if b.label == label)
+
+
+def _script(builds, waves):
+    """'build' and 'wave' steps, alternating while both last"""
+    paired = min(builds, waves)
+    return ['build', 'wave'] * paired + ['build'] * (builds - paired) + ['wave'] * (waves - paired)
+
+
+def _step(at, step, n, sites):
+    """Run one script step (the ``n``-th build or wave) and rerun; returns the rerun's seconds"""
+    if step == 'build':
+        lat, lon = sites[n % len(sites)]
+        at.session_state['build_preview'] = {'type': STRUCTURE_TYPES[n % len(STRUCTURE_TYPES)], 'lat': lat, 'lon': lon}
+        at.run()  # Shows the confirmation panel
+        _button(at.button, "✅ Build").click()
+    elif step == 'wave':
+        _button(at.sidebar.button, "⏭️ Skip to Next Wave").click()
+    start = time.perf_counter()
+    at.run()
+    return time.perf_counter() - start
+
+
+def _footprint(at, processes):
+    state = at.session_state.to_dict()
+    shared = [] if processes else [state['sim']]
+    return session_footprint(state, shared)
+
+
+def run_sessions(count, rounds=20, builds=5, waves=3, shared=False, processes=False, seed=0):
+    """Play ``count`` sessions through the script; returns the metrics for this count.
+
+    Session k plays match ``seed + k``, or every session plays ``seed`` when ``shared``.
+    """
+    from streamlit.testing.v1 import AppTest
+
+    sites = candidate_sites()[1:]  # Skip the HQ itself
+    sessions = []
+    latencies = []
+    start, cpu = time.perf_counter(), time.process_time()
+    for k in range(count):
+        at = AppTest.from_file(APP_PATH, default_timeout=RERUN_TIMEOUT)
+        at.query_params["game"] = str(seed if shared else seed + k)
+        t = time.perf_counter()
+        at.run()
+        latencies.append(time.perf_counter() - t)
+        sessions.append(at)
+    script = _script(builds, waves)
+    for round_ in range(rounds):
+        step = script[round_] if round_ < len(script) else 'idle'
+        n = script[:round_].count(step)
+        for at in sessions:
+            latencies.append(_step(at, step, n, sites))
+    wall, cpu = time.perf_counter() - start, time.process_time() - cpu
+
+    errors = sum(len(at.exception) for at in sessions)
+    matches = sessions[:1] if shared else sessions
+    structures = [len(at.session_state['sim'].read().structures) for at in matches]
+    footprints = [_footprint(at, processes) for at in sessions]
+    totals = np.array([sum(f.values()) for f in footprints]) / 1024
+    by_key = {key: round(float(np.mean([f.get(key, 0) for f in footprints])) / 1024, 1) for key in footprints[0]}
+    for at in matches:
+        at.session_state['sim'].stop()
+    latencies = np.array(latencies) * 1e3
+    return {
+        'sessions': count,
+        'reruns': len(latencies),
+        'errors': errors,
+        'structures_per_match': round(float(np.mean(structures)), 1),
+        'session_kb_mean': round(float(totals.mean()), 1),
+        'session_kb_max': round(float(totals.max()), 1),
+        'session_kb_by_key': by_key,
+        'rerun_p50_ms': round(float(np.percentile(latencies, 50)), 1),
+        'rerun_p95_ms': round(float(np.percentile(latencies, 95)), 1),
+        'rerun_max_ms': round(float(latencies.max()), 1),
+        'cpu_percent': round(100 * cpu / wall, 1),
+        'wall_s': round(wall, 2),
+    }
+
+
+def run_load(counts=SESSION_COUNTS, rounds=20, builds=5, waves=3, shared=False, processes=False,
+             compact=False, cap_mb=0, seed=0, progress=None):
+    """``run_sessions`` for each session count, under one app configuration"""
+    results = []
+    with _environment(YUDDHASPHERE_MATCH_PROCESSES="1" if processes else "0", YUDDHASPHERE_SAVE_DIR="",
+                      YUDDHASPHERE_COMPACT_SESSIONS="1" if compact else "0",
+                      YUDDHASPHERE_SESSION_MEMORY_MB=str(cap_mb)):
+        for count in counts:
+            if progress:
+                progress(count)
+            results.append(run_sessions(count, rounds, builds, waves, shared, processes, seed))
+            seed += count  # Fresh matches for the next count
+    return {
+        'compact': compact,
+        'cap_mb': cap_mb,
+        'shared': shared,
+        'processes': processes,
+        'rounds': rounds,
+        'results': results,
+    }
+
+
+def format_report(report):
+    lines = [f"{'sessions':>8}{'KB/session':>12}{'KB max':>9}{'p50 ms':>9}{'p95 ms':>9}{'max ms':>9}"
+             f"{'CPU %':>8}{'errors':>8}"]
+    for r in report['results']:
+        lines.append(f"{r['sessions']:>8}{r['session_kb_mean']:>12,.0f}{r['session_kb_max']:>9,.0f}"
+                     f"{r['rerun_p50_ms']:>9.0f}{r['rerun_p95_ms']:>9.0f}{r['rerun_max_ms']:>9.0f}"
+                     f"{r['cpu_percent']:>8.0f}{r['errors']:>8}")
+    largest = report['results'][-1]['session_kb_by_key']
+    lines.append("KB/session by key: " + ", ".join(f"{key} {kb:,.0f}" for key, kb in list(largest.items())[:5]))
+    return "\n".join(lines)
+
+
+def main(args):
+    report = run_load(args.sessions or SESSION_COUNTS, args.rounds, args.builds, args.waves, args.shared,
+                      args.processes, args.compact, args.cap_mb, args.seed,
+                      progress=lambda count: print(f"running {count} sessions...", flush=True))
+    print(format_report(report))
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"wrote {args.out}")
+    return 1 if any(r['errors'] for r in report['results']) else 0
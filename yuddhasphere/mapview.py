@@ -0,0 +1,318 @@
+"""Map feature building for the live map: culling, clustering, caching and diffs"""
+import math
+from collections import OrderedDict
+
+import numpy as np
+
+from .engine import MAX_BUILD_RADIUS_KM, PATROLLING, STRUCTURE_HEALTH
+from .units import BASE, DETECTION_KM, STRUCTURE_UNITS
+
+MAP_TILES = "https://{s}.basemaps.cartocdn.com/light_all/{z}/{x}/{y}{r}.png"
+MAP_ATTRIBUTION = "&copy; OpenStreetMap contributors &copy; CARTO"
+CLUSTER_ZOOM = 9  # Below this zoom, crowded structure cells render as one cluster
+CLUSTER_MIN_POINTS = 50  # ...but only when more structures than this are in view
+TRAIL_MIN_ZOOM = 8  # Missile trails are dropped below this zoom
+VIEW_PADDING = 0.25  # Fraction of the viewport added on each side before culling
+RENDER_CACHE_SIZE = 4096  # Cached per-entity map features per session
+COMPACT_RENDER_CACHE_SIZE = 256  # ...in compact sessions
+
+STRUCTURE_ICONS = {name: unit['map_icon'] for name, unit in STRUCTURE_UNITS.items()}
+
+
+class ViewGrid:
+    """Points bucketed by lat/lon cell and sorted by cell key.
+
+    A viewport query binary-searches each cell row it covers instead of
+    testing every point, and per-cell counts and centroids are precomputed
+    for clustered rendering.
+    """
+
+    _ROW = 1 << 32  # Key stride between cell rows
+
+    def __init__(self, items, lat, lon, cell_deg):
+        self.cell_deg = cell_deg
+        cy = np.floor(lat / cell_deg).astype(np.int64)
+        cx = np.floor(lon / cell_deg).astype(np.int64)
+        keys = cy * self._ROW + cx
+        order = np.argsort(keys, kind='stable')
+        self.items = np.asarray(items)[order]
+        self.keys = keys[order]
+        self.cells, starts, self.counts = np.unique(self.keys, return_index=True, return_counts=True)
+        self.cell_starts = starts
+        if len(order):
+            self.cell_lat = np.add.reduceat(lat[order], starts) / self.counts
+            self.cell_lon = np.add.reduceat(lon[order], starts) / self.counts
+        else:
+            self.cell_lat = self.cell_lon = np.zeros(0)
+
+    def _ranges(self, keys, south, west, north, east):
+        x0, x1 = math.floor(west / self.cell_deg), math.floor(east / self.cell_deg)
+        for y in range(math.floor(south / self.cell_deg), math.floor(north / self.cell_deg) + 1):
+            lo = np.searchsorted(keys, y * self._ROW + x0, 'left')
+            hi = np.searchsorted(keys, y * self._ROW + x1, 'right')
+            if hi > lo:
+                yield lo, hi
+
+    def query(self, south, west, north, east):
+        """Items in cells overlapping the box"""
+        parts = [self.items[lo:hi] for lo, hi in self._ranges(self.keys, south, west, north, east)]
+        return np.concatenate(parts) if parts else self.items[:0]
+
+    def query_cells(self, south, west, north, east):
+        """Indexes into cells/counts/cell_lat/cell_lon for cells overlapping the box"""
+        parts = [np.arange(lo, hi) for lo, hi in self._ranges(self.cells, south, west, north, east)]
+        return np.concatenate(parts) if parts else np.zeros(0, np.int64)
+
+    def cell_items(self, cell):
+        start = self.cell_starts[cell]
+        return self.items[start:start + self.counts[cell]]
+
+
+class MapView:
+    """Viewport the browser last reported, and cached cell lookups for culling it"""
+
+    def __init__(self, zoom=10):
+        self.bounds = None  # (south, west, north, east)
+        self.zoom = zoom
+        self._grids = {}
+
+    def update(self, map_data):
+        bounds = (map_data or {}).get("bounds")
+        if bounds and bounds.get("_southWest"):
+            sw, ne = bounds["_southWest"], bounds["_northEast"]
+            self.bounds = (sw["lat"], sw["lng"], ne["lat"], ne["lng"])
+        if (map_data or {}).get("zoom"):
+            self.zoom = map_data["zoom"]
+
+    def padded_bounds(self):
+        south, west, north, east = self.bounds
+        pad_lat, pad_lon = (north - south) * VIEW_PADDING, (east - west) * VIEW_PADDING
+        return south - pad_lat, west - pad_lon, north + pad_lat, east + pad_lon
+
+    def cell_deg(self):
+        """Roughly 64 screen pixels at the current zoom"""
+        return 360 / 2 ** self.zoom / 4
+
+    def structure_grid(self, structures):
+        """ViewGrid over structure slots, rebuilt only when structures are built or removed"""
+        key = (structures.version, self.zoom)
+        grid = self._grids.get(key)
+        if grid is None:
+            self._grids = {k: g for k, g in self._grids.items() if k[0] == structures.version}
+            slots = structures.active()
+            grid = ViewGrid(slots, structures['lat'][slots], structures['lon'][slots], self.cell_deg())
+            self._grids[key] = grid
+        return grid
+
+
+def _in_bounds(lat, lon, bounds):
+    south, west, north, east = bounds
+    return (lat >= south) & (lat <= north) & (lon >= west) & (lon <= east)
+
+
+def _pt(lat, lon):
+    return [round(float(lat), 5), round(float(lon), 5)]
+
+
+def _radar_circle(lat, lon, radius_km):
+    return {'k': 'circle', 'p': _pt(lat, lon), 'r': radius_km * 1000, 'c': '#4a90d9', 'w': 1, 'fo': 0.0,
+            't': f"Radar coverage ({radius_km:.0f}km)"}
+
+
+def static_features(snap):
+    """HQ, construction zone and resource nodes - these never change during a game"""
+    features = {
+        'hq': {'k': 'marker', 'p': _pt(snap.player_lat, snap.player_lon), 'c': 'darkblue', 'i': 'flag',
+               'h': "🏠 Command Center", 't': "Your HQ"},
+        'build_zone': {'k': 'circle', 'p': _pt(snap.player_lat, snap.player_lon), 'r': MAX_BUILD_RADIUS_KM * 1000,
+                       'c': 'green', 'fo': 0.08, 'h': f"Construction Zone ({MAX_BUILD_RADIUS_KM}km radius)"},
+        'hq_radar': _radar_circle(snap.player_lat, snap.player_lon, BASE['detection_km']),
+    }
+    for node in snap.resource_nodes:
+        features[f"n:{node['id']}"] = {
+            'k': 'dot', 'p': _pt(node['lat'], node['lon']), 'r': 8, 'c': 'gold', 'f': 'yellow', 'fo': 0.6,
+            'h': f"💰 Resource Node<br>Resources: {node['resources']}",
+        }
+    return features
+
+
+def structure_feature(structures, slot):
+    s = structures.row_at(slot)
+    health_pct = s['health'] / STRUCTURE_HEALTH[s['type']]
+    color = "green" if health_pct > 0.6 else "orange" if health_pct > 0.3 else "red"
+    popup = f"<b>{s['type']} #{s['id']}</b><br>Health: {int(s['health'])}/{STRUCTURE_HEALTH[s['type']]}"
+    unit = STRUCTURE_UNITS[s['type']]
+    if unit.get('missiles'):
+        popup += f"<br>Missiles: {s['missiles']}"
+    elif unit.get('intercept_rate'):
+        popup += f"<br>Intercepts: {s['intercepts']}"
+    return {'k': 'marker', 'p': _pt(s['lat'], s['lon']), 'c': color, 'i': STRUCTURE_ICONS[s['type']], 'h': popup}
+
+
+class RenderCache:
+    """Per-session memo of map features.
+
+    Static layers are built once per game. Structure features are keyed by
+    (id, revision), so a marker and its popup HTML are rebuilt only after
+    the structure was touched; the least recently used entries are evicted
+    past ``max_entries``. Cached dicts are shared - never mutate them.
+    """
+
+    def __init__(self, max_entries=RENDER_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._static_key = None
+        self._static = {}
+        self._entities = OrderedDict()
+
+    def static_features(self, snap):
+        key = (snap.player_lat, snap.player_lon, tuple((n['id'], n['resources']) for n in snap.resource_nodes))
+        if key != self._static_key:
+            self._static_key, self._static = key, static_features(snap)
+        return self._static
+
+    def structure_feature(self, structures, slot):
+        key = (int(structures.ids[slot]), int(structures.revisions[slot]))
+        feature = self._entities.get(key)
+        if feature is None:
+            feature = self._entities[key] = structure_feature(structures, slot)
+            if len(self._entities) > self.max_entries:
+                self._entities.popitem(last=False)
+        else:
+            self._entities.move_to_end(key)
+        return feature
+
+    def clear(self):
+        self._static_key = None
+        self._static = {}
+        self._entities.clear()
+
+
+def map_features(snap, preview=None, view=None, cache=None):
+    """Map features keyed by a stable ID, in the compact form the live map understands.
+
+    With a reported ``view``, entities outside the padded viewport are left
+    out, and at low zoom crowded structure cells collapse into clusters.
+    A RenderCache reuses static layers and unchanged structure features.
+    """
+    features = dict(cache.static_features(snap) if cache else static_features(snap))
+    culled = view is not None and view.bounds is not None
+    bounds = view.padded_bounds() if culled else None
+    zoom = view.zoom if view is not None else None
+
+    # Structures
+    structures = snap.structures
+    visible = structures.active()
+    if culled:
+        grid = view.structure_grid(structures)
+        visible = grid.query(*bounds)
+        if zoom < CLUSTER_ZOOM and len(visible) > CLUSTER_MIN_POINTS:
+            visible = []
+            for cell in grid.query_cells(*bounds):
+                count = int(grid.counts[cell])
+                if count == 1:
+                    visible.extend(grid.cell_items(cell))
+                    continue
+                features[f"sc:{zoom}:{grid.cells[cell]}"] = {
+                    'k': 'dot', 'p': _pt(grid.cell_lat[cell], grid.cell_lon[cell]), 'r': 8 + 3 * math.log2(count),
+                    'c': '#1f4e79', 'f': '#4a90d9', 'fo': 0.6, 't': f"{count} structures - zoom in for detail",
+                }
+    for slot in visible:
+        feature = cache.structure_feature(structures, slot) if cache else structure_feature(structures, slot)
+        features[f"s:{structures.ids[slot]}"] = feature
+        radius = DETECTION_KM[structures['type'][slot]]
+        if radius > 0:
+            features[f"rc:{structures.ids[slot]}"] = _radar_circle(structures['lat'][slot], structures['lon'][slot], radius)
+
+    # Incoming missiles and their trails
+    missiles = snap.incoming_missiles
+    m_idx = missiles.active()
+    progress = np.minimum(1.0, missiles['progress'][m_idx])
+    start_lat, start_lon = missiles['start_lat'][m_idx], missiles['start_lon'][m_idx]
+    cur_lat = start_lat + progress * (missiles['target_lat'][m_idx] - start_lat)
+    cur_lon = start_lon + progress * (missiles['target_lon'][m_idx] - start_lon)
+    show = missiles['detected'][m_idx].copy()  # Fog of war: undetected threats never reach the browser
+    show_trail = show & (zoom is None or zoom >= TRAIL_MIN_ZOOM)
+    if culled:
+        show &= _in_bounds(cur_lat, cur_lon, bounds)
+        south, west, north, east = bounds
+        show_trail &= ((np.maximum(start_lat, cur_lat) >= south) & (np.minimum(start_lat, cur_lat) <= north)
+                       & (np.maximum(start_lon, cur_lon) >= west) & (np.minimum(start_lon, cur_lon) <= east))
+    for k in np.flatnonzero(show | show_trail):
+        mid = int(missiles.ids[m_idx[k]])
+        cur = _pt(cur_lat[k], cur_lon[k])
+        if show[k]:
+            features[f"m:{mid}"] = {'k': 'dot', 'p': cur, 'r': 10, 'c': 'red', 'f': 'darkred', 'fo': 0.8,
+                                    'h': f"🚀 Enemy Missile<br>Progress: {progress[k]*100:.0f}%"}
+        if show_trail[k]:
+            features[f"mt:{mid}"] = {'k': 'line', 'p': [_pt(start_lat[k], start_lon[k]), cur],
+                                     'c': 'red', 'w': 2, 'o': 0.5}
+
+    # Enemy aircraft
+    aircraft = snap.enemy_aircraft
+    a_idx = aircraft.active()
+    a_idx = a_idx[aircraft['detected'][a_idx]]
+    if culled:
+        a_idx = a_idx[_in_bounds(aircraft['lat'][a_idx], aircraft['lon'][a_idx], bounds)]
+    for slot in a_idx:
+        enemy = aircraft.row_at(slot)
+        features[f"a:{enemy['id']}"] = {'k': 'marker', 'p': _pt(enemy['lat'], enemy['lon']), 'c': 'black',
+                                        'i': 'plane', 'h': f"Enemy Bomber<br>Target: {enemy['target_type']}"}
+
+    # Jets
+    jets = snap.jets
+    j_idx = jets.active()
+    j_idx = j_idx[jets['status'][j_idx] == PATROLLING]
+    if culled:
+        j_idx = j_idx[_in_bounds(jets['lat'][j_idx], jets['lon'][j_idx], bounds)]
+    for slot in j_idx:
+        jet = jets.row_at(slot)
+        features[f"j:{jet['id']}"] = {
+            'k': 'marker', 'p': _pt(jet['lat'], jet['lon']), 'c': 'orange', 'i': 'fighter-jet',
+            'h': f"Fighter Jet #{jet['id']}<br>Missiles: {jet['missiles_left']}<br>Fuel: {int(jet['fuel'])}%",
+        }
+
+    # Build preview
+    if preview:
+        features['preview'] = {'k': 'marker', 'p': _pt(preview['lat'], preview['lon']), 'c': 'purple',
+                               'i': 'plus-circle', 'h': "👆 Click CONFIRM to build"}
+    return features
+
+
+class MapDiffer:
+    """Mirror of the features the browser map holds, used to send only changes.
+
+    Each patch carries the seq it was diffed against; the client reports a
+    higher ``resync`` count when it sees a gap and gets a keyframe next.
+
+    A compact differ keeps a hash of each feature instead of the feature,
+    so its mirror costs a few dozen bytes per feature. In exchange, every
+    patch hashes the features' reprs.
+    """
+
+    def __init__(self, compact=False):
+        self.client = {}
+        self.seq = 0
+        self.resyncs_seen = 0
+        self.compact = compact
+
+    def make_compact(self):
+        """Switch to hashes, dropping the mirrored features"""
+        if not self.compact:
+            self.client = {fid: hash(repr(f)) for fid, f in self.client.items()}
+            self.compact = True
+
+    def patch(self, features, resync=0):
+        mirror = {fid: hash(repr(f)) for fid, f in features.items()} if self.compact else features
+        if resync > self.resyncs_seen or self.seq == 0:
+            self.resyncs_seen = max(resync, self.resyncs_seen)
+            patch = {'seq': self.seq + 1, 'base': None, 'upsert': features, 'remove': []}
+        else:
+            patch = {
+                'seq': self.seq + 1,
+                'base': self.seq,
+                'upsert': {fid: features[fid] for fid, f in mirror.items() if self.client.get(fid) != f},
+                'remove': [fid for fid in self.client if fid not in features],
+            }
+        self.seq += 1
+        self.client = mirror
+        return patch
@@ -0,0 +1,172 @@
+"""Switchable per-phase timers for the tick loop and the render pass.
+
+A Profiler records how long each named phase of a frame took, keeps a
+rolling window per phase for the debug panel, and a bounded trace that
+exports as Chrome trace-event JSON (chrome://tracing, ui.perfetto.dev).
+While disabled every call returns after one attribute check.
+
+``session_footprint`` measures the memory a Streamlit session holds.
+"""
+import json
+import os
+import sys
+import threading
+import time
+import types
+from collections import deque
+from contextlib import contextmanager
+
+import numpy as np
+
+PROFILE_WINDOW = 120  # Frames kept per phase for rolling averages
+TRACE_SIZE = 20000  # Trace events kept for export
+
+
+class Profiler:
+    """Per-phase timings and counters for one kind of frame.
+
+    Phases are timed either as laps - ``start()`` then ``lap(name)`` after
+    each phase, which suits straight-line code like ``game_tick`` - or as
+    ``with span(name):`` blocks. ``end()`` closes the frame. Samples go
+    into deques, so a render thread can read the summary while the sim
+    thread is recording.
+    """
+
+    def __init__(self, name, enabled=False, window=PROFILE_WINDOW, trace_size=TRACE_SIZE):
+        self.name = name
+        self.enabled = enabled
+        self.window = window
+        self._samples = {}
+        self._counters = {}
+        self._trace = deque(maxlen=trace_size)
+        self._frame_start = self._lap_start = 0
+
+    def _record(self, phase, start, end):
+        samples = self._samples.get(phase)
+        if samples is None:
+            samples = self._samples[phase] = deque(maxlen=self.window)
+        samples.append(end - start)
+        self._trace.append((phase, start, end, threading.get_ident()))
+
+    def start(self):
+        """Open a frame"""
+        if self.enabled:
+            self._frame_start = self._lap_start = time.perf_counter_ns()
+
+    def lap(self, phase):
+        """Close ``phase``, which ran since the previous lap or ``start()``"""
+        if self.enabled:
+            now = time.perf_counter_ns()
+            self._record(phase, self._lap_start, now)
+            self._lap_start = now
+
+    def end(self, frame="frame"):
+        """Close the frame opened by ``start()`` and record its total"""
+        if self.enabled and self._frame_start:
+            self._record(frame, self._frame_start, time.perf_counter_ns())
+            self._frame_start = 0
+
+    @contextmanager
+    def span(self, phase):
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            self._record(phase, start, time.perf_counter_ns())
+
+    def count(self, name, value):
+        """Set a counter - entity counts, events handled, pairs tested"""
+        if self.enabled:
+            self._counters[name] = value
+
+    def reset(self):
+        self._samples.clear()
+        self._counters.clear()
+        self._trace.clear()
+
+    def summary(self):
+        """{phase: {'mean_ms', 'p95_ms', 'max_ms', 'n'}} over the rolling window"""
+        out = {}
+        for phase, samples in list(self._samples.items()):
+            ns = np.array(samples, float)
+            if len(ns):
+                out[phase] = {
+                    'mean_ms': ns.mean() / 1e6,
+                    'p95_ms': np.percentile(ns, 95) / 1e6,
+                    'max_ms': ns.max() / 1e6,
+                    'n': len(ns),
+                }
+        return out
+
+    def counters(self):
+        return dict(self._counters)
+
+    def trace_events(self, pid=None):
+        """Recorded spans as Chrome trace 'complete' events"""
+        pid = os.getpid() if pid is None else pid
+        events = [{'name': 'process_name', 'ph': 'M', 'pid': pid, 'args': {'name': self.name}}]
+        for phase, start, end, tid in list(self._trace):
+            events.append({
+                'name': phase, 'cat': self.name, 'ph': 'X', 'pid': pid, 'tid': tid,
+                'ts': start / 1e3, 'dur': (end - start) / 1e3,
+            })
+        return events
+
+
+def export_trace(*profilers):
+    """Chrome trace JSON for one or more profilers, each shown as its own process"""
+    events = []
+    for pid, prof in enumerate(profilers, 1):
+        events.extend(prof.trace_events(pid))
+    return json.dumps({'traceEvents': events, 'displayTimeUnit': 'ms'})
+
+
+_NOT_COUNTED = (type, types.ModuleType, types.FunctionType, types.BuiltinFunctionType, types.MethodType)
+
+
+def deep_sizeof(obj, seen=None):
+    """Bytes held by ``obj`` and everything it references, each object counted once.
+
+    Objects whose ids are already in ``seen`` are skipped, along with
+    whatever only they reference. NumPy arrays count their buffers. Classes,
+    modules and functions are not counted.
+    """
+    seen = set() if seen is None else seen
+    total = 0
+    stack = [obj]
+    while stack:
+        o = stack.pop()
+        if id(o) in seen or isinstance(o, _NOT_COUNTED):
+            continue
+        seen.add(id(o))
+        total += sys.getsizeof(o)
+        if isinstance(o, dict):
+            stack.extend(o.keys())
+            stack.extend(o.values())
+        elif isinstance(o, (list, tuple, set, frozenset, deque)):
+            stack.extend(o)
+        elif isinstance(o, np.ndarray):
+            if o.base is not None:
+                stack.append(o.base)
+            continue
+        if hasattr(o, '__dict__'):
+            stack.append(vars(o))
+        for slot in getattr(type(o), '__slots__', ()):
+            if hasattr(o, slot):
+                stack.append(getattr(o, slot))
+    return total
+
+
+def session_footprint(session_state, shared=()):
+    """{key: bytes} for a session state mapping, biggest first.
+
+    Objects in ``shared`` belong to every session (a match simulation in
+    thread mode, say) and are left out. Anything two keys share is counted
+    under the first.
+    """
+    seen = {id(o) for o in shared}
+    sizes = {key: deep_sizeof(value, seen) for key, value in session_state.items()}
+    return dict(sorted(sizes.items(), key=lambda item: -item[1]))
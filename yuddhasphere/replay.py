@@ -0,0 +1,91 @@
+"""Record and replay games.
+
+A Recording holds what a game needs to be re-run exactly: the seed, the
+start position and wave, the tick length and the command log. ``replay``
+runs it headless, as fast as the CPU allows, applying each command after
+the tick it was recorded at. ``digest`` fingerprints the world so a replay can be
+checked against the game it came from.
+
+Recordings are JSON lines: a header, then one ``[tick, command, kwargs]``
+per line.
+"""
+import hashlib
+import json
+from collections import namedtuple
+
+import numpy as np
+
+from . import commands
+from .engine import TICK_INTERVAL, GameState, game_tick
+
+REPLAY_FORMAT = 2  # 2: bomber attacks no longer draw from the RNG
+
+Recording = namedtuple('Recording', 'seed player_lat player_lon wave dt commands ticks digest')
+
+
+def digest(state):
+    """Short hash of everything the simulation decides - entities, economy, score, clock"""
+    h = hashlib.sha256()
+    for store in (state.structures, state.jets, state.incoming_missiles, state.enemy_aircraft):
+        idx = store.active()
+        h.update(store.ids[idx].tobytes())
+        for name in store.fields:
+            h.update(store[name][idx].tobytes())
+    h.update(np.array([state.resources, state.game_time], np.float64).tobytes())
+    h.update(np.array([state.score, state.wave, state.tick], np.int64).tobytes())
+    return h.hexdigest()[:16]
+
+
+def record(state, dt=TICK_INTERVAL, wave=1):
+    """Recording of the game so far; ``wave`` is the wave it started at"""
+    return Recording(
+        state.seed, state.player_lat, state.player_lon, wave, dt, list(state.command_log), state.tick, digest(state),
+    )
+
+
+def dumps(recording):
+    header = {'format': REPLAY_FORMAT, **recording._asdict()}
+    del header['commands']
+    lines = [json.dumps(header)]
+    lines.extend(json.dumps(list(entry)) for entry in recording.commands)
+    return "\n".join(lines) + "\n"
+
+
+def loads(text):
+    lines = text.splitlines()
+    header = json.loads(lines[0])
+    if header.pop('format', None) != REPLAY_FORMAT:
+        raise ValueError(f"not a YuddhaSphere recording, or an unsupported format version "
+                         f"(this version reads format {REPLAY_FORMAT})")
+    entries = [tuple(json.loads(line)) for line in lines[1:] if line.strip()]
+    return Recording(commands=entries, **header)
+
+
+def save(recording, path):
+    with open(path, "w") as f:
+        f.write(dumps(recording))
+
+
+def load(path):
+    with open(path) as f:
+        return loads(f.read())
+
+
+def advance(state, entries, until, dt=TICK_INTERVAL, prof=None):
+    """Step ``state`` to tick ``until``, applying each (tick, command, kwargs) entry after its tick"""
+    pending = iter(sorted(entries, key=lambda entry: entry[0]))
+    entry = next(pending, None)
+    while True:
+        while entry is not None and entry[0] <= state.tick:
+            commands.apply(state, entry[1], **entry[2])
+            entry = next(pending, None)
+        if state.tick >= until:
+            return state
+        game_tick(state, dt, prof)
+
+
+def replay(recording, ticks=None, prof=None):
+    """Re-run a recording for ``ticks`` ticks (default: its full length) and return the state"""
+    state = GameState(recording.player_lat, recording.player_lon, seed=recording.seed)
+    state.wave = recording.wave
+    return advance(state, recording.commands, recording.ticks if ticks is None else ticks, recording.dt, prof)
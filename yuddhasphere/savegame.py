@@ -0,0 +1,230 @@
+"""Binary save files: periodic keyframes plus small deltas.
+
+A save is one uncompressed zip. A keyframe stores every entity column as a
+``.npy`` member and the rest of the GameState - clock, economy, log, event
+queue, RNG state, command log - as one JSON member. Between keyframes the
+file only gains deltas: the tick reached and the commands issued since the
+last write. Each new keyframe compacts the file, so it holds the game's
+first keyframe, the latest one and the deltas since, and its size stays
+bounded however long the match runs. The engine is deterministic (see
+``replay``), so the latest ticks are the latest keyframe plus a replay of
+at most ``KEYFRAME_EVERY`` ticks; earlier ones replay from the first
+keyframe with the latest command log.
+
+Members are stored rather than compressed, so ``load`` memory-maps the
+columns straight out of the file (copy-on-write) instead of reading them.
+
+Every keyframe records ``SAVE_FORMAT``. ``load`` refuses any other
+version, so bump it whenever the keyframe layout changes.
+"""
+import io
+import json
+import os
+import struct
+import zipfile
+
+import numpy as np
+
+from .engine import TICK_INTERVAL, GameState
+from .replay import advance
+from .units import DETECTION_KM
+
+SAVE_FORMAT = 3  # 2: log kept as structured event records; 3: missiles and bombers gain `detected`
+KEYFRAME_EVERY = 120  # Ticks between keyframes - also the most a load has to replay
+DELTA_EVERY = 10  # Ticks between deltas when no commands come in
+
+STORES = ('structures', 'jets', 'incoming_missiles', 'enemy_aircraft')
+_FIRST_KEYFRAME = 'keyframe/000000/'  # Kept through every compaction
+_SCALARS = (
+    'seed', 'player_lat', 'player_lon', 'resources', 'score', 'wave', 'resource_nodes',
+    'last_wave_spawn', 'enemy_missiles_intercepted', 'structures_destroyed', 'game_speed', 'paused',
+    'game_time', 'tick',
+)
+
+
+def _json_default(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def _npy(array):
+    buf = io.BytesIO()
+    np.lib.format.write_array(buf, np.ascontiguousarray(array), allow_pickle=False)
+    return buf.getvalue()
+
+
+def _keyframe_members(state, dt):
+    meta = {name: getattr(state, name) for name in _SCALARS}
+    events, seq = state.events.dump()
+    meta.update(
+        format=SAVE_FORMAT,
+        dt=dt,
+        rng=state.rng.bit_generator.state,
+        events=events,
+        event_seq=seq,
+        engagements=[[mid, sid, enter, leave] for (mid, sid), (enter, leave) in state.engagements.items()],
+        command_log=state.command_log,
+        log=state.log.dump(),
+    )
+    members = {'state.json': json.dumps(meta, default=_json_default).encode()}
+    for store in STORES:
+        for name, array in getattr(state, store).dump().items():
+            members[f'{store}/{name}.npy'] = _npy(array)
+    return members
+
+
+class SaveWriter:
+    """Writes one game's keyframes and deltas to a save file.
+
+    Call ``update`` after ticks and after commands; it writes a keyframe
+    every ``keyframe_every`` ticks and otherwise a delta once there are new
+    commands or ``delta_every`` ticks have passed. Deltas are appended; a
+    keyframe rewrites the file as the first keyframe plus itself, replacing
+    it atomically.
+    """
+
+    def __init__(self, path, keyframe_every=KEYFRAME_EVERY, delta_every=DELTA_EVERY, dt=TICK_INTERVAL):
+        self.path = path
+        self.keyframe_every = keyframe_every
+        self.delta_every = delta_every
+        self.dt = dt
+        self._keyframes = self._deltas = 0
+        self._keyframe_tick = self._delta_tick = None
+        self._commands = 0  # Commands already in the file
+        try:
+            with zipfile.ZipFile(path) as zf:
+                names = zf.namelist()
+            self._keyframes = max((int(n.split('/')[1]) + 1 for n in names if n.startswith('keyframe/')), default=0)
+            self._deltas = sum(n.startswith('delta/') for n in names)
+        except FileNotFoundError:
+            pass
+
+    def _append(self, members):
+        with zipfile.ZipFile(self.path, 'a', zipfile.ZIP_STORED) as zf:
+            for name, data in members.items():
+                zf.writestr(name, data)
+
+    def _compact(self, members):
+        """Replace the file with its first keyframe plus ``members``"""
+        tmp = self.path + '.tmp'
+        with zipfile.ZipFile(self.path) as old, zipfile.ZipFile(tmp, 'w', zipfile.ZIP_STORED) as zf:
+            for info in old.infolist():
+                if info.filename.startswith(_FIRST_KEYFRAME):
+                    zf.writestr(info, old.read(info))
+            for name, data in members.items():
+                zf.writestr(name, data)
+        os.replace(tmp, self.path)
+
+    def keyframe(self, state):
+        prefix = f'keyframe/{self._keyframes:06d}/'
+        members = {prefix + name: data for name, data in _keyframe_members(state, self.dt).items()}
+        if self._keyframes == 0:
+            self._append(members)
+        else:
+            self._compact(members)  # Drops the previous keyframe and its deltas
+            self._deltas = 0
+        self._keyframes += 1
+        self._keyframe_tick = self._delta_tick = state.tick
+        self._commands = len(state.command_log)
+
+    def delta(self, state):
+        new = state.command_log[self._commands:]
+        body = {'tick': state.tick, 'start': self._commands, 'commands': new}
+        self._append({f'delta/{self._deltas:06d}.json': json.dumps(body, default=_json_default).encode()})
+        self._deltas += 1
+        self._delta_tick = state.tick
+        self._commands += len(new)
+
+    def update(self, state):
+        """Write whatever is due"""
+        if self._keyframe_tick is None or state.tick - self._keyframe_tick >= self.keyframe_every:
+            self.keyframe(state)
+        elif len(state.command_log) > self._commands or state.tick - self._delta_tick >= self.delta_every:
+            self.delta(state)
+
+
+def _member_array(f, path, zf, info):
+    """A .npy member as a copy-on-write memmap of the save file"""
+    if info.compress_type != zipfile.ZIP_STORED:
+        return np.load(io.BytesIO(zf.read(info)))
+    f.seek(info.header_offset + 26)
+    name_len, extra_len = struct.unpack('<HH', f.read(4))
+    f.seek(info.header_offset + 30 + name_len + extra_len)
+    version = np.lib.format.read_magic(f)
+    if version == (1, 0):
+        shape, fortran, dtype = np.lib.format.read_array_header_1_0(f)
+    else:
+        shape, fortran, dtype = np.lib.format.read_array_header_2_0(f)
+    if 0 in shape:
+        return np.zeros(shape, dtype)
+    return np.memmap(path, dtype, mode='c', offset=f.tell(), shape=shape, order='F' if fortran else 'C')
+
+
+def timeline(path):
+    """(keyframe ticks, latest tick) in a save file"""
+    with zipfile.ZipFile(path) as zf:
+        keyframes = [json.loads(zf.read(n))['tick'] for n in zf.namelist()
+                     if n.startswith('keyframe/') and n.endswith('/state.json')]
+        deltas = [json.loads(zf.read(n))['tick'] for n in zf.namelist() if n.startswith('delta/')]
+    return sorted(set(keyframes)), max(keyframes + deltas, default=0)
+
+
+def load(path, tick=None, prof=None):
+    """Rebuild the GameState at ``tick`` (default: the latest one saved).
+
+    Starts from the last keyframe at or before ``tick`` and replays the
+    recorded commands - the latest keyframe's log plus the deltas - from there.
+    """
+    with zipfile.ZipFile(path) as zf, open(path, 'rb') as f:
+        names = zf.namelist()
+        keyframes = {}
+        for name in names:
+            if name.startswith('keyframe/') and name.endswith('/state.json'):
+                keyframes[name[:-len('state.json')]] = json.loads(zf.read(name))
+        deltas = [json.loads(zf.read(name)) for name in sorted(n for n in names if n.startswith('delta/'))]
+        latest = max([meta['tick'] for meta in keyframes.values()] + [d['tick'] for d in deltas])
+        tick = latest if tick is None else tick
+        if not 0 <= tick <= latest:
+            raise ValueError(f"tick {tick} is outside the saved range 0-{latest}")
+        usable = [prefix for prefix, meta in keyframes.items() if meta['tick'] <= tick]
+        if not usable:
+            raise ValueError(f"no keyframe at or before tick {tick}")
+        prefix = max(usable, key=lambda p: (keyframes[p]['tick'], p))
+        meta = keyframes[prefix]
+        if meta.get('format') != SAVE_FORMAT:
+            raise ValueError(f"save format {meta.get('format', 'unversioned')} is not supported "
+                             f"(this version reads format {SAVE_FORMAT})")
+
+        state = GameState(meta['player_lat'], meta['player_lon'], seed=meta['seed'])
+        for name in _SCALARS:
+            setattr(state, name, meta[name])
+        state.rng.bit_generator.state = meta['rng']
+        state.events.load(meta['events'], meta['event_seq'])
+        state.engagements = {(mid, sid): (enter, leave) for mid, sid, enter, leave in meta['engagements']}
+        state.command_log = [tuple(entry) for entry in meta['command_log']]
+        state.log.load(meta['log'])
+        for store in STORES:
+            members = {
+                name[len(prefix) + len(store) + 1:-len('.npy')]: _member_array(f, path, zf, zf.getinfo(name))
+                for name in names if name.startswith(f'{prefix}{store}/')
+            }
+            getattr(state, store).load(members)
+
+    # Rebuild the spatial index in build (ID) order, as the live game inserted them, and radar coverage
+    structures = state.structures
+    for slot in sorted(structures.active(), key=lambda s: structures.ids[s]):
+        code, lat, lon = structures['type'][slot], structures['lat'][slot], structures['lon'][slot]
+        state.structure_index.insert(int(slot), code, lat, lon)
+        if DETECTION_KM[code] > 0:
+            state.coverage.add(lat, lon, DETECTION_KM[code])
+
+    # Commands issued after the keyframe, then replay up to the requested tick
+    newest = max(keyframes.values(), key=lambda m: m['tick'])
+    entries = [tuple(entry) for entry in newest['command_log']]
+    for delta in deltas:
+        for k, entry in enumerate(delta['commands'], delta['start']):
+            if k >= len(entries):
+                entries.append(tuple(entry))
+    pending = entries[len(state.command_log):]
+    return advance(state, [e for e in pending if e[0] <= tick], tick, meta['dt'], prof)
@@ -0,0 +1,334 @@
+"""Match hosting: one authoritative simulation per match, shared by sessions.
+
+``MatchHost.join(seed)`` hands out a handle on the match with that seed,
+starting it (or resuming it from its save) if it is not running. Every
+session that joins the same match shares one simulation, so spectators and
+teammates cost a snapshot read each instead of a world each.
+
+With ``processes=True`` each match runs in its own server process
+(``python -m yuddhasphere serve``), so matches spread across cores.
+Sessions talk to it over a local
+``multiprocessing.connection`` socket (a Unix socket on Linux, a named pipe
+on Windows). The server pickles each published snapshot once and sends the
+same bytes to every subscriber, and only when it changed since that
+subscriber's last read. With ``processes=False`` matches are Simulation
+threads in the calling process.
+
+A match server exits once its simulation stops, i.e. after
+``SIM_IDLE_TIMEOUT`` seconds with nobody reading it. The next ``join``
+resumes it from its save; a ``MatchClient`` whose server went away does
+that itself on its next call.
+"""
+import json
+import multiprocessing
+import os
+import pickle
+import subprocess
+import sys
+import threading
+import time
+from multiprocessing.connection import Client, Listener
+from types import MappingProxyType
+
+from .engine import GameState, new_seed
+from .eventlog import JsonlSink
+from .savegame import SaveWriter, load
+from .sim import Simulation
+
+SERVER_EXIT_WAIT = 5.0  # Seconds a client waits for a dying match server before rejoining
+
+
+def open_match(seed, save_path=None):
+    """Unstarted Simulation for a match, resumed from ``save_path`` when it exists.
+
+    With a save, the match's events are also appended to a JSON-lines file
+    next to it (``<seed>.events.jsonl``). A save that cannot be loaded is
+    renamed to ``<seed>.ysave.bad`` and the match starts over, with a
+    warning on stderr and in the game log. A resumed match makes up for the
+    time since the save was last written (see ``Simulation``).
+    """
+    state, problem, gap = None, None, 0.0
+    if save_path and os.path.exists(save_path):
+        try:
+            gap = time.time() - os.path.getmtime(save_path)  # Last written when the match stopped
+            state = load(save_path)
+        except Exception as e:  # Old format, truncated write, ... - never let a bad save block the match
+            problem = str(e)
+            os.replace(save_path, save_path + ".bad")
+            print(f"warning: could not resume game {seed} from {save_path} ({problem}); "
+                  f"moved it to {save_path}.bad and started a new game", file=sys.stderr)
+    if state is None:
+        state = GameState(seed=seed)
+        if problem:
+            state.log.emit(0.0, 'save_discarded', (problem,))
+    if save_path:
+        state.log.sink = JsonlSink(os.path.splitext(save_path)[0] + ".events.jsonl")
+    return Simulation(state, SaveWriter(save_path) if save_path else None, resume_gap=gap if problem is None else 0.0)
+
+
+def _pack(snapshot):
+    # MappingProxyType does not pickle; the client freezes these again
+    return pickle.dumps(
+        snapshot._replace(resource_nodes=[dict(node) for node in snapshot.resource_nodes]),
+        pickle.HIGHEST_PROTOCOL,
+    )
+
+
+def _unpack(data):
+    snapshot = pickle.loads(data)
+    for store in (snapshot.structures, snapshot.jets, snapshot.incoming_missiles, snapshot.enemy_aircraft):
+        for array in (*store.columns.values(), store.ids, store.revisions, store.alive):
+            array.flags.writeable = False
+    return snapshot._replace(resource_nodes=tuple(MappingProxyType(node) for node in snapshot.resource_nodes))
+
+
+class _Publisher:
+    """Pickles each published snapshot once for all subscribers"""
+
+    def __init__(self, sim):
+        self.sim = sim
+        self._lock = threading.Lock()
+        self._version = None
+        self._data = None
+
+    def read(self, since):
+        """(version, pickled snapshot), or None if ``since`` is already current"""
+        with self._lock:
+            snapshot, version = self.sim.read(), self.sim.published
+            if version == since:
+                return None
+            if version != self._version:
+                self._version, self._data = version, _pack(snapshot)
+            return self._version, self._data
+
+
+def _serve_client(conn, sim, publisher):
+    handlers = {
+        'read': publisher.read,
+        'apply': sim.apply,
+        'control': sim.control,
+        'export_replay': sim.export_replay,
+        'save': sim.save,
+        'stop': sim.stop,
+        'profile': lambda enabled: setattr(sim.profiler, 'enabled', enabled),
+        'profile_summary': sim.profiler.summary,
+        'profile_counters': sim.profiler.counters,
+        'profile_reset': sim.profiler.reset,
+        'profile_trace': sim.profiler.trace_events,
+    }
+    with conn:
+        while True:
+            try:
+                op, args, kwargs = conn.recv()
+            except (EOFError, OSError):
+                return
+            try:
+                reply = (True, handlers[op](*args, **kwargs))
+            except Exception as exc:
+                reply = (False, exc)
+            try:
+                conn.send(reply)
+            except OSError:
+                return
+
+
+def _accept(listener, sim):
+    publisher = _Publisher(sim)
+    while True:
+        try:
+            conn = listener.accept()
+        except OSError:
+            return  # Listener closed
+        except multiprocessing.AuthenticationError:
+            continue
+        threading.Thread(target=_serve_client, args=(conn, sim, publisher), daemon=True).start()
+
+
+def serve_match(seed, save_path, authkey):
+    """Match server process: run the match and serve sessions until it goes idle.
+
+    Prints the listener's address as a JSON line once it accepts connections.
+    """
+    sim = open_match(seed, save_path)
+    listener = Listener(authkey=authkey)
+    print(json.dumps(listener.address), flush=True)
+    sim.start()
+    threading.Thread(target=_accept, args=(listener, sim), daemon=True).start()
+    sim.join()
+    listener.close()
+
+
+class _RemoteProfiler:
+    """Stands in for the match server's Profiler"""
+
+    name = "sim"
+
+    def __init__(self, client):
+        self._client = client
+        self._enabled = False
+
+    @property
+    def enabled(self):
+        return self._enabled
+
+    @enabled.setter
+    def enabled(self, value):
+        if value != self._enabled:
+            self._client._call('profile', value)
+            self._enabled = value
+
+    def summary(self):
+        return self._client._call('profile_summary')
+
+    def counters(self):
+        return self._client._call('profile_counters')
+
+    def reset(self):
+        self._client._call('profile_reset')
+
+    def trace_events(self, pid=None):
+        return self._client._call('profile_trace', pid)
+
+
+class MatchClient:
+    """A session's connection to a match server; offers the same calls as Simulation.
+
+    When the server has exited (idled out, crashed or was killed), the next
+    call rejoins the match through ``host`` - resuming it from its save - and
+    is retried once on the new connection.
+    """
+
+    def __init__(self, seed, host, process, address):
+        self.seed = seed
+        self.profiler = _RemoteProfiler(self)
+        self._host = host
+        self._process = process
+        self._conn = Client(address, authkey=host._authkey)
+        self._lock = threading.Lock()  # Download callbacks may call in from another thread
+        self._version = None
+        self._snapshot = None
+
+    def _send(self, op, args, kwargs):
+        self._conn.send((op, args, kwargs))
+        return self._conn.recv()
+
+    def _call(self, op, *args, **kwargs):
+        with self._lock:
+            try:
+                ok, value = self._send(op, args, kwargs)
+            except (EOFError, OSError):
+                self._rejoin()
+                ok, value = self._send(op, args, kwargs)
+        if not ok:
+            raise value
+        return value
+
+    def _rejoin(self):
+        self._conn.close()
+        try:
+            self._process.wait(SERVER_EXIT_WAIT)  # So a server still shutting down is not handed out again
+        except subprocess.TimeoutExpired:
+            pass
+        self._process, address = self._host._server(self.seed)
+        self._conn = Client(address, authkey=self._host._authkey)
+        self._version = None  # The new server has its own snapshot count
+        if self.profiler.enabled:
+            self._send('profile', (True,), {})
+
+    def is_alive(self):
+        return self._process.poll() is None
+
+    def read(self):
+        """Latest snapshot; only transferred when it changed since the last read"""
+        update = self._call('read', self._version)
+        if update is not None:
+            self._version, data = update
+            self._snapshot = _unpack(data)
+        return self._snapshot
+
+    def apply(self, command, **kwargs):
+        return self._call('apply', command, **kwargs)
+
+    def control(self, paused=None, game_speed=None):
+        self._call('control', paused=paused, game_speed=game_speed)
+
+    def export_replay(self):
+        return self._call('export_replay')
+
+    def save(self):
+        return self._call('save')
+
+    def stop(self):
+        if self.is_alive():  # Rejoining a match just to stop it would start it again
+            self._call('stop')
+
+    def close(self):
+        self._conn.close()
+
+
+class MatchHost:
+    """Starts matches on demand and hands out handles to them.
+
+    ``save_dir`` (optional) holds one autosave per match, named by seed.
+    """
+
+    def __init__(self, save_dir=None, processes=True):
+        self.save_dir = save_dir
+        self.processes = processes
+        self._authkey = os.urandom(32)
+        self._matches = {}  # seed -> Simulation, or (Popen, address) with processes
+        self._lock = threading.Lock()
+
+    def save_path(self, seed):
+        if not self.save_dir:
+            return None
+        os.makedirs(self.save_dir, exist_ok=True)
+        return os.path.abspath(os.path.join(self.save_dir, f"{seed}.ysave"))
+
+    def _spawn(self, seed):
+        args = [sys.executable, "-m", "yuddhasphere", "serve", str(seed)]
+        if self.save_dir:
+            args += ["--save", self.save_path(seed)]
+        # Not multiprocessing: spawn would re-run Streamlit's __main__ (app.py) in the child
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        process = subprocess.Popen(args, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True, cwd=root)
+        process.stdin.write(self._authkey.hex() + "\n")
+        process.stdin.close()
+        line = process.stdout.readline()
+        process.stdout.close()
+        if not line:
+            process.wait()
+            raise RuntimeError(f"match server for game {seed} exited with status {process.returncode}")
+        return process, json.loads(line)
+
+    def _server(self, seed):
+        """(process, address) of the match server for ``seed``, starting it if it is not running"""
+        with self._lock:
+            match = self._matches.get(seed)
+            if match is None or match[0].poll() is not None:
+                match = self._matches[seed] = self._spawn(seed)
+            return match
+
+    def join(self, seed=None):
+        """Handle on the match ``seed`` (a new match when None), starting it if needed"""
+        seed = new_seed() if seed is None else seed
+        if self.processes:
+            return MatchClient(seed, self, *self._server(seed))
+        with self._lock:
+            match = self._matches.get(seed)
+            if match is None:
+                match = open_match(seed, self.save_path(seed))
+            elif match.ident is not None and not match.is_alive():
+                # Idled out: pick up where it stopped, making up for the time it was stopped
+                match = Simulation(match.state, match.saver, resume_gap=time.monotonic() - match.stopped_at)
+            if match.ident is None:
+                match.start()
+            self._matches[seed] = match
+        return match
+
+    def matches(self):
+        """Seeds of the matches still running"""
+        with self._lock:
+            if self.processes:
+                return [seed for seed, (process, _) in self._matches.items() if process.poll() is None]
+            return [seed for seed, sim in self._matches.items() if sim.is_alive()]
@@ -0,0 +1,143 @@
+"""Background thread that steps a GameState and publishes snapshots"""
+import threading
+import time
+from contextlib import contextmanager
+
+from . import commands, replay
+from .engine import TICK_INTERVAL, game_tick, take_snapshot
+from .profiling import Profiler
+
+CATCH_UP_BUDGET = 0.05  # CPU seconds one wake may spend on ticks; the rest of the backlog waits
+FAST_FORWARD_AFTER = 10 * TICK_INTERVAL  # Backlog (game seconds) past which the sim fast-forwards
+SIM_IDLE_TIMEOUT = 60.0  # Stop the sim thread when no render has read it for this long
+MAX_RESUME_GAP = 300.0  # Most wall seconds a resumed match makes up for
+
+
+class Simulation(threading.Thread):
+    """Steps a GameState at a fixed rate and publishes snapshots for rendering.
+
+    The thread owns ``state``; everything else reads ``snapshot``, which is
+    replaced wholesale after each batch of steps so readers never see a
+    half-updated world; ``published`` counts the replacements. Player
+    commands go through ``apply()`` and pause/speed through ``control()``.
+    When the thread falls behind it runs ticks for at most
+    ``CATCH_UP_BUDGET`` CPU seconds per wake and carries the rest over; a
+    backlog beyond ``FAST_FORWARD_AFTER`` is skipped with the
+    ``fast_forward`` command, so it lands in the command log and replays.
+    ``profiler`` times each tick's phases once enabled. With a ``saver``
+    (a ``savegame.SaveWriter``) the game is autosaved as it runs, with a
+    final keyframe when the thread stops; an event log sink is flushed then
+    too.
+
+    A match whose thread idled out (or whose server exited) resumes with
+    ``resume_gap``, the wall seconds it was stopped. Up to
+    ``MAX_RESUME_GAP`` of that is fast-forwarded on the first wake, so a
+    backgrounded tab comes back to a match that kept going.
+    """
+
+    def __init__(self, state, saver=None, resume_gap=0.0):
+        super().__init__(name="game-sim", daemon=True)
+        self.state = state
+        self.lock = threading.Lock()
+        self.profiler = Profiler("sim")
+        self.saver = saver
+        self.snapshot = take_snapshot(state)
+        self.published = 0
+        self.last_read = time.monotonic()
+        self.stopped_at = None  # time.monotonic() when the thread stopped
+        self.resume_gap = min(max(resume_gap, 0.0), MAX_RESUME_GAP)
+        self._stop_event = threading.Event()
+
+    def run(self):
+        accumulator = 0.0 if self.state.paused else self.resume_gap * self.state.game_speed
+        last = time.monotonic()
+        while not self._stop_event.is_set():
+            now = time.monotonic()
+            if now - self.last_read > SIM_IDLE_TIMEOUT:
+                break
+            with self.lock:
+                if not self.state.paused:
+                    accumulator += (now - last) * self.state.game_speed
+                last = now
+                steps = 0
+                if accumulator > FAST_FORWARD_AFTER:
+                    skipped = accumulator - accumulator % TICK_INTERVAL
+                    with self.profiler.span("fast-forward"):
+                        commands.apply(self.state, "fast_forward", seconds=skipped)
+                    accumulator -= skipped
+                    steps += 1
+                deadline = time.thread_time() + CATCH_UP_BUDGET
+                while accumulator >= TICK_INTERVAL:
+                    game_tick(self.state, TICK_INTERVAL, self.profiler)
+                    accumulator -= TICK_INTERVAL
+                    steps += 1
+                    if time.thread_time() >= deadline:
+                        break  # Over budget; pick the backlog up next wake
+                if steps:
+                    with self.profiler.span("snapshot"):
+                        self._publish()
+                    if self.saver:
+                        with self.profiler.span("save"):
+                            self.saver.update(self.state)
+                wait = max(TICK_INTERVAL - accumulator, 0.0) / max(self.state.game_speed, 0.1)
+            self._stop_event.wait(wait)
+        with self.lock:
+            if self.saver:
+                self.saver.keyframe(self.state)
+            if self.state.log.sink:
+                self.state.log.sink.flush()
+            self.stopped_at = time.monotonic()
+
+    @property
+    def seed(self):
+        return self.state.seed
+
+    def _publish(self):
+        self.snapshot = take_snapshot(self.state)
+        self.published += 1
+
+    def read(self):
+        """Latest published snapshot"""
+        self.last_read = time.monotonic()
+        return self.snapshot
+
+    @contextmanager
+    def command(self):
+        """Mutate the state between steps and publish the result immediately"""
+        with self.lock:
+            yield self.state
+            self._publish()
+            if self.saver:
+                self.saver.update(self.state)
+
+    def apply(self, command, **kwargs):
+        """Run and record a player command (see ``commands``); returns its result"""
+        with self.command() as state:
+            return commands.apply(state, command, **kwargs)
+
+    def control(self, paused=None, game_speed=None):
+        """Pause/resume or change the game speed"""
+        with self.command() as state:
+            if paused is not None:
+                state.paused = paused
+            if game_speed is not None:
+                state.game_speed = game_speed
+
+    def export_replay(self):
+        """The game so far as a replay recording (JSON lines)"""
+        with self.lock:
+            return replay.dumps(replay.record(self.state))
+
+    def save(self):
+        """Write a keyframe now; returns the save path, or None without a saver"""
+        if self.saver is None:
+            return None
+        with self.lock:
+            self.saver.keyframe(self.state)
+        return self.saver.path
+
+    def stop(self):
+        self._stop_event.set()
+
+    def close(self):
+        """Let go of the match; nothing to release for a thread (see ``MatchClient.close``)"""
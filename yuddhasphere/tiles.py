@@ -0,0 +1,211 @@
+"""Local map tiles: a disk cache with an LRU size cap and a small tile server.
+
+``TileCache`` keeps slippy-map tiles as ``<root>/<z>/<x>/<y>.png``. A miss
+is fetched from ``upstream`` (the CARTO basemap by default) and written to
+disk, unless the cache is offline (``upstream=None``), in which case it is
+simply a miss. Once the files pass ``max_bytes``, the least recently used
+ones are deleted. Recency is kept in file mtimes, so it survives restarts.
+
+``seed`` fills the cache with the tiles the game uses: India at low zooms
+and the area around the base at the zooms the map opens at. The default
+directory is ``TILE_DIR``, under the app's ``static/``. With
+``YUDDHASPHERE_LOCAL_TILES=1`` the app serves that directory through
+Streamlit's static file route: same origin, same protocol, no extra port.
+Seed it on a connected machine and copy it across for air-gapped use:
+
+    python -m yuddhasphere tiles seed
+
+``TileServer`` serves ``/<z>/<x>/<y>.png`` from a cache on a background
+thread, for clients other than the app. It listens on localhost unless
+given another address. It only answers for valid tile coordinates up to
+``MAX_ZOOM``, so it cannot be used to fetch arbitrary URLs upstream.
+"""
+import math
+import os
+import re
+import threading
+import urllib.request
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from .engine import DEFAULT_ORIGIN, MAX_BUILD_RADIUS_KM
+from .geo import EARTH_RADIUS_KM
+from .geography import territory
+from .mapview import MAP_TILES
+
+TILE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "static", "tiles")
+TILE_CACHE_BYTES = 512 * 1024 * 1024  # Default size cap of a cache directory
+TILE_PORT = 8765
+MAX_ZOOM = 19  # Deepest zoom the map (and the CARTO basemap) goes to
+FETCH_TIMEOUT = 10.0  # Seconds per upstream request
+USER_AGENT = "yuddhasphere-tile-cache"
+INDIA_ZOOMS = range(4, 8)  # Whole-country zooms
+BASE_ZOOMS = range(8, 13)  # Zooms around the base; the map opens at 10
+BASE_SEED_KM = 2 * MAX_BUILD_RADIUS_KM  # Radius around the base seeded at BASE_ZOOMS
+
+_TILE_PATH = re.compile(r"^/(\d+)/(\d+)/(\d+)\.png$")
+
+
+def valid_tile(z, x, y):
+    return 0 <= z <= MAX_ZOOM and 0 <= x < 1 << z and 0 <= y < 1 << z
+
+
+def tile_xy(lat, lon, zoom):
+    """The (x, y) of the Web Mercator tile containing a point"""
+    n = 1 << zoom
+    lat = max(min(lat, 85.0511), -85.0511)
+    x = int((lon + 180.0) / 360.0 * n)
+    y = int((1.0 - math.asinh(math.tan(math.radians(lat))) / math.pi) / 2.0 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+
+def tile_range(south, west, north, east, zoom):
+    """Every (z, x, y) covering a bounding box at one zoom"""
+    x0, y0 = tile_xy(north, west, zoom)
+    x1, y1 = tile_xy(south, east, zoom)
+    return [(zoom, x, y) for x in range(x0, x1 + 1) for y in range(y0, y1 + 1)]
+
+
+def seed_tiles(origin=DEFAULT_ORIGIN):
+    """The tiles ``seed`` fetches: India at INDIA_ZOOMS, BASE_SEED_KM around ``origin`` at BASE_ZOOMS"""
+    tiles = [t for z in INDIA_ZOOMS for t in tile_range(*territory().bounds, z)]
+    lat, lon = origin
+    dlat = math.degrees(BASE_SEED_KM / EARTH_RADIUS_KM)
+    dlon = dlat / math.cos(math.radians(lat))
+    return tiles + [t for z in BASE_ZOOMS for t in tile_range(lat - dlat, lon - dlon, lat + dlat, lon + dlon, z)]
+
+
+class TileCache:
+    """Tiles on disk under ``root``, filled from ``upstream`` and capped at ``max_bytes``"""
+
+    def __init__(self, root=TILE_DIR, upstream=MAP_TILES, max_bytes=TILE_CACHE_BYTES):
+        self.root = root
+        self.upstream = upstream
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._sizes = OrderedDict()  # (z, x, y) -> bytes, least recently used first
+        self.bytes = 0
+        self.hits = self.misses = 0
+        found = []
+        for z in _numbered(root):
+            for x in _numbered(os.path.join(root, str(z))):
+                folder = os.path.join(root, str(z), str(x))
+                for name in os.listdir(folder):
+                    if name.endswith(".png") and name[:-4].isdigit():
+                        info = os.stat(os.path.join(folder, name))
+                        found.append((info.st_mtime, (z, x, int(name[:-4])), info.st_size))
+        for _, key, size in sorted(found):
+            self._sizes[key] = size
+            self.bytes += size
+
+    def __len__(self):
+        return len(self._sizes)
+
+    def path(self, z, x, y):
+        return os.path.join(self.root, str(z), str(x), f"{y}.png")
+
+    def get(self, z, x, y):
+        """The tile's PNG bytes, fetching it on a miss; None if it is not cached and cannot be fetched"""
+        if not valid_tile(z, x, y):
+            return None
+        key = (z, x, y)
+        with self._lock:
+            cached = key in self._sizes
+            if cached:
+                self._sizes.move_to_end(key)
+        if cached:
+            try:
+                with open(self.path(*key), "rb") as f:
+                    data = f.read()
+                os.utime(self.path(*key))
+                self.hits += 1
+                return data
+            except FileNotFoundError:  # Deleted behind our back
+                with self._lock:
+                    self.bytes -= self._sizes.pop(key, 0)
+        self.misses += 1
+        if self.upstream is None:
+            return None
+        data = self._fetch(z, x, y)
+        if data is not None:
+            self.put(z, x, y, data)
+        return data
+
+    def put(self, z, x, y, data):
+        key = (z, x, y)
+        path = self.path(*key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+        with self._lock:
+            self.bytes += len(data) - self._sizes.pop(key, 0)
+            self._sizes[key] = len(data)
+            self._evict()
+
+    def _evict(self):
+        while self.bytes > self.max_bytes and len(self._sizes) > 1:
+            key, size = self._sizes.popitem(last=False)
+            self.bytes -= size
+            try:
+                os.remove(self.path(*key))
+            except FileNotFoundError:
+                pass
+
+    def _fetch(self, z, x, y):
+        url = self.upstream.format(s="abc"[(x + y) % 3], z=z, x=x, y=y, r="")
+        request = urllib.request.Request(url, headers={"User-Agent": USER_AGENT})
+        try:
+            with urllib.request.urlopen(request, timeout=FETCH_TIMEOUT) as response:
+                return response.read()
+        except OSError:
+            return None
+
+    def seed(self, tiles):
+        """Make sure ``tiles`` are cached; returns how many could not be had"""
+        return sum(self.get(*tile) is None for tile in tiles)
+
+
+def _numbered(folder):
+    try:
+        return [int(name) for name in os.listdir(folder) if name.isdigit()]
+    except FileNotFoundError:
+        return []
+
+
+class _TileHandler(BaseHTTPRequestHandler):
+    cache = None  # Set per server by TileServer
+
+    def do_GET(self):
+        match = _TILE_PATH.match(self.path.split("?", 1)[0])
+        data = self.cache.get(*map(int, match.groups())) if match else None
+        if data is None:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "image/png")
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("Cache-Control", "public, max-age=86400")
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TileServer:
+    """Serves a TileCache over HTTP at ``/<z>/<x>/<y>.png`` from a daemon thread"""
+
+    def __init__(self, cache, host="127.0.0.1", port=TILE_PORT):
+        self.cache = cache
+        handler = type("TileHandler", (_TileHandler,), {"cache": cache})
+        self._server = ThreadingHTTPServer((host, port), handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, name="tile-server", daemon=True)
+        self._thread.start()
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
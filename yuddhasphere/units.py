@@ -0,0 +1,96 @@
+"""Unit definitions, loaded from ``units.json`` and compiled to lookup arrays.
+
+Structure types get integer codes in file order, and every per-type stat
+becomes a NumPy array indexed by code, so the tick reads
+``MAX_HEALTH[codes]`` instead of comparing names. A type's behaviour follows
+from its stats: an ``intercept_rate`` makes it shoot down missiles within
+``range_km``, ``jets`` lets it launch jets, ``missiles`` stocks it for
+launches, ``income_bonus`` adds to income, ``detection_km`` extends radar
+coverage beyond the base's own. New types therefore only need an
+entry in the data file; ``icon`` and ``map_icon`` fall back to a generic
+building. The base, jets, enemy missiles and enemy bombers have one entry
+each.
+"""
+import json
+import os
+
+import numpy as np
+
+UNITS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "units.json")
+
+# Per-type fields: (dtype, default when a unit leaves it out)
+STRUCTURE_FIELDS = {
+    'cost': (np.int64, None),
+    'health': (np.float64, None),
+    'missiles': (np.int32, 0),
+    'range_km': (np.float64, 0.0),
+    'intercept_rate': (np.float64, 0.0),
+    'income_bonus': (np.float64, 0.0),
+    'detection_km': (np.float64, 0.0),
+    'defense': (bool, False),
+    'jets': (bool, False),
+    'bomber_target': (bool, False),
+}
+# Display fields and their defaults: emoji for the sidebar, Font Awesome icon for the map
+STRUCTURE_DISPLAY = {
+    'icon': "🏗️",
+    'map_icon': "building",
+}
+# Required fields of the single-entry sections
+SECTION_FIELDS = {
+    'base': ('detection_km',),
+    'jet': ('cost', 'missiles', 'fuel', 'fuel_burn', 'range_km', 'hit_rate'),
+    'missile': ('blast_radius_km',),
+    'bomber': ('health', 'speed_km_s', 'attack_range_km', 'damage_per_s'),
+}
+
+
+def load_units(path=UNITS_PATH):
+    """Read and check a unit file"""
+    with open(path, encoding="utf-8") as f:
+        units = json.load(f)
+    names = [unit.get('name') for unit in units['structures']]
+    if not names or None in names or len(set(names)) != len(names):
+        raise ValueError(f"{path}: every structure needs a unique name")
+    if len(names) > np.iinfo(np.int8).max:
+        raise ValueError(f"{path}: too many structure types for int8 type codes")
+    for unit in units['structures']:
+        missing = [field for field, (_, default) in STRUCTURE_FIELDS.items() if default is None and field not in unit]
+        if missing:
+            raise ValueError(f"{path}: {unit['name']} is missing {', '.join(missing)}")
+        for field, default in STRUCTURE_DISPLAY.items():
+            unit.setdefault(field, default)
+    for section, fields in SECTION_FIELDS.items():
+        missing = [field for field in fields if field not in units.get(section, {})]
+        if missing:
+            raise ValueError(f"{path}: {section} is missing {', '.join(missing)}")
+    return units
+
+
+def compile_structures(structures):
+    """{field: array indexed by type code} for ``STRUCTURE_FIELDS``"""
+    return {
+        field: np.array([unit.get(field, default) for unit in structures], dtype)
+        for field, (dtype, default) in STRUCTURE_FIELDS.items()
+    }
+
+
+UNITS = load_units()
+STRUCTURE_UNITS = {unit['name']: unit for unit in UNITS['structures']}  # Raw definitions, for the UI
+STRUCTURE_TYPES = list(STRUCTURE_UNITS)
+_TABLES = compile_structures(UNITS['structures'])
+COST = _TABLES['cost']
+MAX_HEALTH = _TABLES['health']
+START_MISSILES = _TABLES['missiles']
+RANGE_KM = _TABLES['range_km']
+INTERCEPT_RATE = _TABLES['intercept_rate']
+INCOME_BONUS = _TABLES['income_bonus']
+DETECTION_KM = _TABLES['detection_km']
+DEFENSE = _TABLES['defense']
+LAUNCHES_JETS = _TABLES['jets']
+INTERCEPTOR_TYPES = np.flatnonzero(INTERCEPT_RATE > 0).tolist()
+BOMBER_TARGETS = [name for name, target in zip(STRUCTURE_TYPES, _TABLES['bomber_target']) if target]
+BASE = UNITS['base']
+JET = UNITS['jet']
+MISSILE = UNITS['missile']
+BOMBER = UNITS['bomber']